@@ -1,6 +1,7 @@
 import argparse
 import sys
 import logging
+from typing import List, Optional
 
 from core.decode_core import load_and_restore_from_chunks
 
@@ -8,8 +9,13 @@ from core.decode_core import load_and_restore_from_chunks
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
-    """主函数，命令行界面"""
+def main(argv: Optional[List[str]] = None):
+    """
+    主函数，命令行界面
+
+    参数:
+    argv (Optional[List[str]]): 命令行参数列表，None表示使用sys.argv（便于在进程内调用）
+    """
     parser = argparse.ArgumentParser(
         description="文件解码解压缩工具 - 从分块文件中恢复原始文件",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -18,24 +24,36 @@ def main():
   python -m cli.decode_cli restore.patch                    # 使用默认参数恢复文件
   python -m cli.decode_cli restore.patch -i output/compress # 指定输入基础文件名
   python -m cli.decode_cli restore.patch -v                 # 启用详细输出模式
+  python -m cli.decode_cli restore.patch --binary           # 读取二进制分块(.bin)
+  python -m cli.decode_cli restore.patch --single-output    # 读取单文件输出compress.txt
+  python -m cli.decode_cli restore.patch --workers 4        # 使用4个线程并行读取分块文件
         """
     )
 
     parser.add_argument('output_file', help='保存还原文件的路径')
     parser.add_argument('-i', '--input', default='compress',
                        help='输入分块文件基础名称，默认"compress"')
-    parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli'], default='brotli',
-                       help='解压缩算法 (zlib/lzma/brotli)，默认brotli')
+    parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli', 'zstd'], default='brotli',
+                       help='解压缩算法 (zlib/lzma/brotli/zstd)，默认brotli')
     parser.add_argument('-d', '--decrypt', action='store_true', default=True,
                        help='启用AES解密（默认启用）')
     parser.add_argument('-k', '--key', default='encode_patch',
                        help='AES解密密钥，默认"encode_patch"')
     parser.add_argument('--no-decrypt', action='store_true',
                        help='禁用AES解密')
+    parser.add_argument('--binary', action='store_true',
+                       help='读取未经Base64编码的二进制分块(.bin)')
+    parser.add_argument('--single-output', action='store_true',
+                       help='读取单文件输出模式的文件(<输入基础名称>.txt)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='并行读取分块文件的线程数，默认最多32个')
     parser.add_argument('-v', '--verbose', action='store_true',
                        help='启用详细输出模式')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers 必须大于0")
 
     # 处理解密参数：--no-decrypt优先级高于默认解密
     decrypt_enabled = args.decrypt and not args.no_decrypt
@@ -50,6 +68,7 @@ def main():
     logger.info(f"输出文件: {args.output_file}")
     logger.info(f"输入基础名称: {args.input}")
     logger.info(f"解压缩算法: {args.algorithm}")
+    logger.info(f"输入格式: {'二进制' if args.binary else 'Base64文本'}")
     logger.info(f"AES解密: {'启用' if decrypt_enabled else '禁用'}")
     if decrypt_enabled:
         logger.info(f"解密密钥: {args.key}")
@@ -60,7 +79,10 @@ def main():
         args.input,
         args.algorithm,
         decrypt_enabled,
-        args.key
+        args.key,
+        args.binary,
+        args.single_output,
+        args.workers
     )
 
     if success:
@@ -1,16 +1,22 @@
 import argparse
 import sys
 import logging
+from typing import List, Optional
 import os
 
-from core.encode_core import compress_and_encode, save_encoded_string_in_chunks, should_encrypt_file
+from core.encode_core import compress_and_save_in_chunks, should_encrypt_file
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
-    """主函数，命令行界面"""
+def main(argv: Optional[List[str]] = None):
+    """
+    主函数，命令行界面
+
+    参数:
+    argv (Optional[List[str]]): 命令行参数列表，None表示使用sys.argv（便于在进程内调用）
+    """
     parser = argparse.ArgumentParser(
         description="文件压缩编码工具 - 将文件压缩为Base64字符串并分块保存",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -20,14 +26,18 @@ def main():
   python -m cli.encode_cli test.patch -c 9 -s 5000       # 使用最高压缩级别，分块大小5000
   python -m cli.encode_cli test.patch -o output/compress # 指定输出文件名
   python -m cli.encode_cli test.patch -v                 # 启用详细输出模式
+  python -m cli.encode_cli test.patch --binary           # 输出二进制分块，不进行Base64编码
+  python -m cli.encode_cli test.patch --single-output    # 所有分块写入单个compress.txt
         """
     )
 
     parser.add_argument('input_file', help='要压缩的输入文件路径')
-    parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli'], default='brotli',
-                       help='压缩算法 (zlib/lzma/brotli)，默认brotli')
+    parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli', 'zstd'], default='brotli',
+                       help='压缩算法 (zlib/lzma/brotli/zstd)，默认brotli')
     parser.add_argument('-c', '--compression', type=int, default=9, choices=range(10),
                        help='压缩级别 (0-9)，0=无压缩，9=最高压缩，默认9')
+    parser.add_argument('--brotli-quality', type=int, default=None, choices=range(12),
+                       help='brotli质量 (0-11)，默认由压缩级别映射，最高为6')
     parser.add_argument('-s', '--chunk-size', type=int, default=3000,
                        help='分块大小（字符数），默认3000')
     parser.add_argument('-o', '--output', default='compress',
@@ -38,15 +48,19 @@ def main():
                        help='AES加密密钥，默认"encode_patch"')
     parser.add_argument('--no-encrypt', action='store_true',
                        help='禁用AES加密')
+    parser.add_argument('--binary', action='store_true',
+                       help='跳过Base64编码，输出原始二进制分块(.bin)，体积减少约25%%')
+    parser.add_argument('--single-output', action='store_true',
+                       help='所有分块写入单个文件(<输出基础名称>.txt)，分块之间以"---"行分隔')
     parser.add_argument('-v', '--verbose', action='store_true',
                        help='启用详细输出模式')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # 获取文件大小用于智能决策
-    if os.path.exists(args.input_file):
-        file_size = os.path.getsize(args.input_file)
-    else:
+    try:
+        file_size = os.stat(args.input_file).st_size
+    except OSError:
         file_size = 0
 
     # 处理加密参数：--no-encrypt优先级高于默认加密
@@ -70,31 +84,37 @@ def main():
     logger.info(f"输入文件: {args.input_file}")
     logger.info(f"压缩算法: {args.algorithm}")
     logger.info(f"压缩级别: {args.compression}")
+    if args.algorithm == 'brotli' and args.brotli_quality is not None:
+        logger.info(f"brotli质量: {args.brotli_quality}")
     logger.info(f"分块大小: {args.chunk_size}")
     logger.info(f"输出基础名称: {args.output}")
+    logger.info(f"输出格式: {'二进制' if args.binary else 'Base64文本'}")
     logger.info(f"AES加密: {'启用' if encrypt_enabled else '禁用'}")
     if encrypt_enabled:
         logger.info(f"加密密钥: {args.key}")
 
-    # 压缩编码文件
-    encoded_string, file_hash = compress_and_encode(args.input_file, args.compression, args.algorithm, encrypt_enabled, args.key)
-
-    if encoded_string is None:
-        logger.error("压缩编码失败，程序退出")
-        sys.exit(1)
-
-    # 分块保存
-    success = save_encoded_string_in_chunks(
-        encoded_string,
+    # 流式压缩编码并分块保存
+    success = compress_and_save_in_chunks(
+        args.input_file,
         args.chunk_size,
-        args.output
+        args.output,
+        args.compression,
+        args.algorithm,
+        encrypt_enabled,
+        args.key,
+        args.brotli_quality,
+        args.binary,
+        args.single_output
     )
 
     if success:
         logger.info("文件压缩编码完成")
-        logger.info(f"输出文件保存为: {args.output}*.txt")
+        if args.single_output:
+            logger.info(f"输出文件保存为: {args.output}.txt")
+        else:
+            logger.info(f"输出文件保存为: {args.output}*{'.bin' if args.binary else '.txt'}")
     else:
-        logger.error("保存分块文件失败")
+        logger.error("压缩编码失败，程序退出")
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -1,9 +1,24 @@
-import zlib
 import base64
 import os
-import hashlib
 import logging
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.encode_core import (
+    BINARY_CHUNK_EXTENSION, GCM_NONCE_SIZE, GCM_TAG_SIZE, MODE_TAG_GCM, READ_BLOCK_SIZE, TEXT_CHUNK_EXTENSION,
+    get_aes_algorithm,
+)
+from core.legacy_cipher import LEGACY_NONCE_SIZE, create_legacy_decryptor
+
+try:
+    # zlib-ng与zlib接口兼容，使用SIMD加速的校验和与匹配查找，输出格式相同
+    from zlib_ng import zlib_ng as zlib
+    ZLIB_NG_AVAILABLE = True
+except ImportError:
+    import zlib
+    ZLIB_NG_AVAILABLE = False
 
 try:
     import lzma
@@ -18,9 +33,20 @@ except ImportError:
     BROTLI_AVAILABLE = False
 
 try:
-    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-    from cryptography.hazmat.primitives import padding
-    from cryptography.hazmat.backends import default_backend
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, modes
+    from cryptography.exceptions import InvalidTag
     CRYPTOGRAPHY_AVAILABLE = True
 except ImportError:
     CRYPTOGRAPHY_AVAILABLE = False
@@ -28,89 +54,258 @@ except ImportError:
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def aes_decrypt(encrypted_data: bytes, key: str) -> bytes:
+# 并行读取分块文件的最大线程数
+MAX_READ_WORKERS = 32
+
+# 流式解码时每次Base64解码的字符数，必须为4的倍数
+B64_DECODE_BLOCK_SIZE = 64 * 1024
+
+# 流式Base64解码时忽略的字符：空白字符和单文件输出的分隔符'-'（不在Base64字母表中）
+B64_IGNORED_CHARS = b" \t\n\r\x0b\x0c-"
+
+# 小于该字符数的数据使用标准库base64，避免SIMD分派的固定开销
+# (解码的SIMD收益出现得比编码早，阈值更低)
+PYBASE64_DECODE_THRESHOLD = 256
+
+def b64decode_data(encoded: Union[str, bytes, bytearray, memoryview]) -> Union[bytes, bytearray]:
+    """
+    解码Base64字符串或ASCII字节串，较大数据优先使用pybase64 (SIMD加速)
+
+    不做字母表校验，数据损坏由后续解密/解压缩步骤报错。pybase64路径直接返回
+    bytearray，解密和解压缩函数均接受该缓冲区，无需再转换。
     """
-    使用AES解密数据（自动检测模式）
+    if PYBASE64_AVAILABLE and len(encoded) >= PYBASE64_DECODE_THRESHOLD:
+        return pybase64.b64decode_as_bytearray(encoded, validate=False)
+    return base64.b64decode(encoded, validate=False)
+
+def create_stream_decryptor(header: bytes, key: str):
+    """
+    根据加密数据开头的标记和nonce创建流式AES解密器
 
     参数:
-    encrypted_data (bytes): 要解密的数据（包含IV/nonce）
+    header (bytes): GCM数据为 模式标记 + 12字节nonce，旧版数据为16字节nonce
     key (str): 解密密钥
 
     返回:
-    bytes: 解密后的数据
+    CipherContext: 解密器
+    """
+    if len(header) == 1 + GCM_NONCE_SIZE:
+        return Cipher(get_aes_algorithm(key), modes.GCM(header[1:])).decryptor()
+
+    # 旧版编码器输出的CTR数据
+    return create_legacy_decryptor(header, key)
+
+def iter_decrypted_blocks(blocks: Iterable[bytes], key: str, legacy: bool = False) -> Iterator[bytes]:
+    """
+    流式AES解密（根据首字节的模式标记选择解密模式）
+
+    GCM数据格式与aes_decrypt相同: 模式标记 + nonce + 密文 + 认证标签，
+    末尾16字节作为认证标签保留到结束时校验。首字节不是GCM标记的数据
+    来自旧版编码器: 16字节nonce + AES-CTR密文，使用旧版密钥处理方式解密。
+
+    参数:
+    blocks (Iterable[bytes]): 加密数据块
+    key (str): 解密密钥
+    legacy (bool): 忽略模式标记，始终按旧版格式解密（旧版nonce首字节恰好等于GCM标记时使用）
+
+    返回:
+    Iterator[bytes]: 解密后的数据块
     """
     if not CRYPTOGRAPHY_AVAILABLE:
         raise ImportError("cryptography库不可用，请安装: pip install cryptography")
 
-    if len(encrypted_data) < 16:
+    buffer = bytearray()
+    decryptor = None
+    tag_size = 0
+
+    for block in blocks:
+        buffer += block
+
+        if decryptor is None:
+            # 读取模式标记和nonce
+            if not buffer:
+                continue
+            gcm = buffer[0] == MODE_TAG_GCM and not legacy
+            header_size = 1 + GCM_NONCE_SIZE if gcm else LEGACY_NONCE_SIZE
+            if len(buffer) < header_size:
+                continue
+            decryptor = create_stream_decryptor(bytes(buffer[:header_size]), key)
+            tag_size = GCM_TAG_SIZE if gcm else 0
+            del buffer[:header_size]
+
+        # 末尾的tag_size字节可能是认证标签，暂不解密
+        if len(buffer) > tag_size:
+            n = len(buffer) - tag_size
+            decrypted = decryptor.update(bytes(buffer[:n]))
+            del buffer[:n]
+            if decrypted:
+                yield decrypted
+
+    if decryptor is None or len(buffer) < tag_size:
         raise ValueError("加密数据太短")
 
-    # 提取IV/nonce和加密数据
-    iv_or_nonce = encrypted_data[:16]
-    encrypted_content = encrypted_data[16:]
+    if tag_size:
+        try:
+            decrypted = decryptor.finalize_with_tag(bytes(buffer))
+        except InvalidTag:
+            raise ValueError("GCM认证失败: 密钥错误或数据已损坏")
+    else:
+        decrypted = decryptor.finalize()
 
-    # 将密钥转换为32字节（256位）
-    key_bytes = key.encode('utf-8')
-    if len(key_bytes) < 32:
-        key_bytes = key_bytes.ljust(32, b'\x00')
-    elif len(key_bytes) > 32:
-        key_bytes = key_bytes[:32]
+    if decrypted:
+        yield decrypted
+
+def aes_decrypt(encrypted_data: bytes, key: str, legacy: bool = False) -> bytes:
+    """
+    使用AES解密数据（根据首字节的模式标记选择解密模式）
+
+    参数:
+    encrypted_data (bytes): 要解密的数据（GCM格式或旧版CTR格式）
+    key (str): 解密密钥
+    legacy (bool): 忽略模式标记，始终按旧版格式解密
+
+    返回:
+    bytes: 解密后的数据
+
+    异常:
+    ValueError: GCM认证失败（密钥错误或数据已损坏）或数据太短
+    """
+    return b"".join(iter_decrypted_blocks((encrypted_data,), key, legacy))
+
+def check_gcm_authentication(blocks: Iterable[bytes], key: str) -> Optional[ValueError]:
+    """
+    只解密不输出，校验GCM数据的认证标签
+
+    流式还原时解压缩可能先于认证标签校验报错，还原失败后用此函数确认是否为GCM认证失败。
+
+    参数:
+    blocks (Iterable[bytes]): 加密数据块
+    key (str): 解密密钥
+
+    返回:
+    Optional[ValueError]: 数据带GCM标记且认证失败时返回认证错误，否则返回None
+    """
+    blocks = iter(blocks)
+    for block in blocks:
+        if block:
+            break
+    else:
+        return None
+
+    if block[0] != MODE_TAG_GCM:
+        return None
 
-    # 首先尝试CTR模式解密（默认模式）
     try:
-        cipher = Cipher(algorithms.AES(key_bytes), modes.CTR(iv_or_nonce), backend=default_backend())
-        decryptor = cipher.decryptor()
-        decrypted_data = decryptor.update(encrypted_content) + decryptor.finalize()
-        return decrypted_data
-    except Exception as ctr_error:
-        # CTR模式失败，尝试CBC模式（向后兼容）
-        try:
-            cipher = Cipher(algorithms.AES(key_bytes), modes.CBC(iv_or_nonce), backend=default_backend())
-            decryptor = cipher.decryptor()
+        for _ in iter_decrypted_blocks(chain((block,), blocks), key):
+            pass
+    except ValueError as e:
+        return e
+    return None
 
-            # 解密
-            decrypted_padded = decryptor.update(encrypted_content) + decryptor.finalize()
+def create_decompressor(algorithm: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """
+    创建增量解压缩器
 
-            # 移除PKCS7填充 (AES块大小为16字节 = 128位)
-            unpadder = padding.PKCS7(128).unpadder()
-            decrypted_data = unpadder.update(decrypted_padded) + unpadder.finalize()
+    参数:
+    algorithm (str): 解压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')
 
-            return decrypted_data
-        except Exception as cbc_error:
-            # CBC也失败，尝试OFB模式
-            try:
-                cipher = Cipher(algorithms.AES(key_bytes), modes.OFB(iv_or_nonce), backend=default_backend())
-                decryptor = cipher.decryptor()
-                decrypted_data = decryptor.update(encrypted_content) + decryptor.finalize()
-                return decrypted_data
-            except Exception as ofb_error:
-                # 所有模式都失败，提供详细错误信息
-                error_msg = f"无法解密数据，所有解密模式均失败:\n"
-                error_msg += f"  CTR模式错误: {str(ctr_error)}\n"
-                error_msg += f"  CBC模式错误: {str(cbc_error)}\n"
-                error_msg += f"  OFB模式错误: {str(ofb_error)}\n"
-                error_msg += "可能原因: 密钥错误、数据损坏或使用了不支持的加密模式"
-                raise ValueError(error_msg)
-
-def decode_and_decompress(encoded_string: str, algorithm: str = 'brotli', decrypt: bool = False, key: str = 'encode_patch') -> Optional[str]:
+    返回:
+    Tuple[Callable, Callable]: (process, finish)，process处理一个数据块，
+    finish输出剩余数据并在压缩数据不完整时抛出ValueError
+    """
+    if algorithm == 'zlib':
+        decompressor = zlib.decompressobj()
+
+        def finish() -> bytes:
+            data = decompressor.flush()
+            if not decompressor.eof:
+                raise ValueError("zlib压缩数据不完整")
+            return data
+        return decompressor.decompress, finish
+    elif algorithm == 'lzma':
+        if not LZMA_AVAILABLE:
+            raise ValueError("lzma模块不可用，无法解压缩lzma格式文件")
+        decompressor = lzma.LZMADecompressor()
+
+        def finish() -> bytes:
+            if not decompressor.eof:
+                raise ValueError("lzma压缩数据不完整")
+            return b""
+        return decompressor.decompress, finish
+    elif algorithm == 'brotli':
+        if not BROTLI_AVAILABLE:
+            raise ValueError("brotli模块不可用，无法解压缩brotli格式文件")
+        decompressor = brotli.Decompressor()
+
+        def finish() -> bytes:
+            if not decompressor.is_finished():
+                raise ValueError("brotli压缩数据不完整")
+            return b""
+        return decompressor.process, finish
+    elif algorithm == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandard模块不可用，无法解压缩zstd格式文件")
+        # 流式写入的帧头中没有内容大小，使用decompressobj解压
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+        def finish() -> bytes:
+            data = decompressor.flush()
+            if not getattr(decompressor, 'eof', True):
+                raise ValueError("zstd压缩数据不完整")
+            return data
+        return decompressor.decompress, finish
+    else:
+        raise ValueError(f"不支持的解压缩算法: {algorithm}")
+
+def iter_b64_decoded_blocks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    流式Base64解码
+
+    去除各分块中的空白字符和单文件输出模式的分隔符，跨分块保留不足4字符的尾部，
+    累积到B64_DECODE_BLOCK_SIZE后再一次性解码，减少小块调用开销。
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk.translate(None, B64_IGNORED_CHARS)
+        if len(buffer) >= B64_DECODE_BLOCK_SIZE:
+            aligned = len(buffer) - len(buffer) % 4
+            with memoryview(buffer)[:aligned] as view:
+                decoded = b64decode_data(view)
+            del buffer[:aligned]
+            yield decoded
+
+    if buffer:
+        yield b64decode_data(buffer)
+
+def decode_and_decompress(encoded_string: Union[str, bytes], algorithm: str = 'brotli', decrypt: bool = False, key: str = 'encode_patch') -> Optional[bytes]:
     """
     解码Base64字符串并使用指定算法解压缩
 
     参数:
-    encoded_string (str): 要解码解压缩的编码字符串
-    algorithm (str): 解压缩算法 ('zlib', 'lzma', 'brotli')，默认'brotli'
+    encoded_string (Union[str, bytes]): 要解码解压缩的Base64字符串或ASCII字节串
+    algorithm (str): 解压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')，默认'brotli'
 
     返回:
-    Optional[str]: 原始解压缩字符串，如果出错则返回None
+    Optional[bytes]: 原始文件内容，如果出错则返回None
     """
-    if not encoded_string or encoded_string.strip() == "":
+    if not encoded_string:
         logger.error("输入的编码字符串为空")
         return None
 
+    # 先创建解压缩器，算法不支持时无需解码
+    try:
+        process, finish = create_decompressor(algorithm)
+    except ValueError as e:
+        logger.error(str(e))
+        return None
+
     try:
         logger.debug("开始Base64解码...")
-        encoded_bytes = encoded_string.encode('utf-8')
-        decoded_bytes = base64.b64decode(encoded_bytes)
+        # 解码时忽略空白字符，只含空白的输入解码结果为空
+        decoded_bytes = b64decode_data(encoded_string)
+        if not decoded_bytes:
+            logger.error("输入的编码字符串为空")
+            return None
 
         # 可选AES解密（在解压缩之前）
         if decrypt:
@@ -118,38 +313,32 @@ def decode_and_decompress(encoded_string: str, algorithm: str = 'brotli', decryp
             logger.info(f"解密密钥: {key}")
             try:
                 decrypted_bytes = aes_decrypt(decoded_bytes, key)
-                logger.info(f"解密后大小: {len(decrypted_bytes)} 字节")
-                decoded_bytes = decrypted_bytes
             except ImportError as e:
                 logger.error(f"AES解密失败: {e}")
                 return None
+            except ValueError as e:
+                # 旧版数据的随机nonce首字节有1/256的概率等于GCM标记，GCM认证失败时按旧版格式解密，
+                # 由解压缩校验结果；仍然失败时报告GCM认证错误
+                if decoded_bytes[:1] == bytes([MODE_TAG_GCM]):
+                    try:
+                        legacy_process, legacy_finish = create_decompressor(algorithm)
+                        decompressed_bytes = legacy_process(aes_decrypt(decoded_bytes, key, legacy=True)) + legacy_finish()
+                        logger.info(f"按旧版CTR格式解密成功，原始大小: {len(decompressed_bytes)} 字节")
+                        return decompressed_bytes
+                    except Exception:
+                        pass
+                logger.error(f"AES解密失败: {e}")
+                return None
+            logger.info(f"解密后大小: {len(decrypted_bytes)} 字节")
+            decoded_bytes = decrypted_bytes
         else:
             logger.info("跳过AES解密")
 
         logger.debug(f"开始{algorithm}解压缩...")
-
-        # 根据算法选择解压缩方法
-        if algorithm == 'zlib':
-            decompressed_bytes = zlib.decompress(decoded_bytes)
-        elif algorithm == 'lzma':
-            if not LZMA_AVAILABLE:
-                logger.error("lzma模块不可用，无法解压缩lzma格式文件")
-                return None
-            decompressed_bytes = lzma.decompress(decoded_bytes)
-        elif algorithm == 'brotli':
-            if not BROTLI_AVAILABLE:
-                logger.error("brotli模块不可用，无法解压缩brotli格式文件")
-                return None
-            decompressed_bytes = brotli.decompress(decoded_bytes)
-        else:
-            logger.error(f"不支持的解压缩算法: {algorithm}")
-            return None
-
-        logger.debug("开始UTF-8解码...")
-        original_string = decompressed_bytes.decode('utf-8')
+        decompressed_bytes = process(decoded_bytes) + finish()
 
         logger.info(f"成功解码解压缩，原始大小: {len(decompressed_bytes)} 字节")
-        return original_string
+        return decompressed_bytes
 
     except base64.binascii.Error as e:
         logger.error(f"Base64解码错误: {e}")
@@ -157,86 +346,228 @@ def decode_and_decompress(encoded_string: str, algorithm: str = 'brotli', decryp
     except zlib.error as e:
         logger.error(f"zlib解压缩错误: {e}")
         return None
-    except UnicodeDecodeError as e:
-        logger.error(f"UTF-8解码错误: {e}")
-        return None
     except Exception as e:
         logger.error(f"解码解压缩过程中出现未知错误: {e}")
         return None
 
-def load_and_restore_from_chunks(restored_code_path: str, base_filename: str = "compress", algorithm: str = 'brotli', decrypt: bool = False, key: str = 'encode_patch') -> bool:
+def find_chunk_files(base_filename: str, extension: str = TEXT_CHUNK_EXTENSION) -> List[str]:
     """
-    从分块文件中加载数据，解码解压缩，然后保存到目标文件
+    通过一次目录扫描查找分块文件，避免逐个文件探测
 
     参数:
-    restored_code_path (str): 保存还原文件的路径
     base_filename (str): 分块文件的基础文件名
-    algorithm (str): 解压缩算法 ('zlib', 'lzma', 'brotli')，默认'brotli'
+    extension (str): 分块文件扩展名，默认".txt"
 
     返回:
-    bool: 还原成功返回True，否则返回False
+    List[str]: 从0开始连续编号的分块文件路径，按编号排序；没有分块文件时返回空列表
+
+    异常:
+    ValueError: 分块编号不连续（缺少中间的分块文件，数据不完整）
     """
-    combined_string = ""
-    file_index = 0
+    directory = os.path.dirname(base_filename)
+    prefix = os.path.basename(base_filename)
 
-    logger.info("开始加载分块文件...")
+    indices = {}
+    try:
+        with os.scandir(directory or ".") as entries:
+            for entry in entries:
+                name = entry.name
+                if not (name.startswith(prefix) and name.endswith(extension)):
+                    continue
+                suffix = name[len(prefix):-len(extension)]
+                if suffix.isdigit() and entry.is_file():
+                    indices[int(suffix)] = os.path.join(directory, name)
+    except FileNotFoundError:
+        return []
+
+    # 编号必须从0开始连续，缺失的编号说明分块文件不完整
+    for index in range(len(indices)):
+        if index not in indices:
+            raise ValueError(f"分块文件编号不连续，缺少: {base_filename}{index}{extension}")
+
+    return [indices[index] for index in range(len(indices))]
+
+def iter_single_file_contents(file_path: str) -> Iterator[bytes]:
+    """按READ_BLOCK_SIZE分块读取单文件输出模式的文件"""
+    with open(file_path, 'rb') as f:
+        yield from iter(lambda: f.read(READ_BLOCK_SIZE), b"")
+
+def read_chunk_file(file_path: str) -> bytes:
+    """读取单个分块文件的原始字节"""
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def iter_chunk_contents(chunk_files: List[str], workers: Optional[int] = None) -> Iterator[bytes]:
+    """
+    使用线程池并行预读分块文件，按编号顺序产出内容（文件I/O期间会释放GIL）
 
-    while True:
-        file_path = f"{base_filename}{file_index}.txt"
-        if not os.path.exists(file_path):
-            if file_index == 0:
-                logger.error(f"找不到分块文件: {file_path}")
-                return False
-            break  # 没有更多分块文件可读取
+    预读数量有上限，内存占用与分块总数无关。
 
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                chunk = f.read()
-                combined_string += chunk
+    参数:
+    chunk_files (List[str]): 按顺序排列的分块文件路径
+    workers (Optional[int]): 读取线程数，默认MAX_READ_WORKERS；1表示在当前线程中依次读取
 
-            file_index += 1
+    返回:
+    Iterator[bytes]: 与输入顺序一致的文件内容
+    """
+    workers = min(workers or MAX_READ_WORKERS, len(chunk_files))
+    if workers <= 1:
+        for file_path in chunk_files:
+            yield read_chunk_file(file_path)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(read_chunk_file, file_path) for file_path in chunk_files[:workers * 2])
+        next_index = len(pending)
+        while pending:
+            content = pending.popleft().result()
+            if next_index < len(chunk_files):
+                pending.append(executor.submit(read_chunk_file, chunk_files[next_index]))
+                next_index += 1
+            yield content
+
+def write_restored_file(blocks: Iterable[bytes], algorithm: str, restored_code_path: str) -> int:
+    """
+    解压缩数据块并写入还原文件
 
-            if file_index % 10 == 0:
-                logger.info(f"已加载 {file_index} 个分块文件")
+    输出先写入临时文件，全部成功（包括GCM认证）后再替换目标文件，失败时删除临时文件。
 
-        except Exception as e:
-            logger.error(f"读取分块文件出错 {file_path}: {e}")
+    参数:
+    blocks (Iterable[bytes]): 已解码（和解密）的压缩数据块
+    algorithm (str): 解压缩算法
+    restored_code_path (str): 还原文件路径
+
+    返回:
+    int: 还原后的文件大小（字节）
+    """
+    process, finish = create_decompressor(algorithm)
+    temp_path = f"{restored_code_path}.tmp"
+    original_size = 0
+
+    try:
+        with open(temp_path, 'wb') as f_out:
+            for block in blocks:
+                data = process(block)
+                if data:
+                    f_out.write(data)
+                    original_size += len(data)
+            data = finish()
+            f_out.write(data)
+            original_size += len(data)
+        os.replace(temp_path, restored_code_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return original_size
+
+def load_and_restore_from_chunks(restored_code_path: str, base_filename: str = "compress", algorithm: str = 'brotli', decrypt: bool = False, key: str = 'encode_patch', binary: bool = False, single_output: bool = False, workers: Optional[int] = None) -> bool:
+    """
+    从分块文件中流式加载数据，解码、解密、解压缩，然后保存到目标文件
+
+    各阶段逐块处理，不在内存中拼接完整的编码字符串或解码数据。
+    输出先写入临时文件，全部成功（包括GCM认证）后再替换目标文件。
+
+    参数:
+    restored_code_path (str): 保存还原文件的路径
+    base_filename (str): 分块文件的基础文件名
+    algorithm (str): 解压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')，默认'brotli'
+    binary (bool): 读取未经Base64编码的二进制分块 (.bin)
+    single_output (bool): 从单文件输出模式的 <base_filename>.txt 读取
+    workers (Optional[int]): 并行读取分块文件的线程数，默认MAX_READ_WORKERS
+
+    返回:
+    bool: 还原成功返回True，否则返回False
+    """
+    logger.info("开始加载分块文件...")
+
+    if single_output:
+        if binary:
+            logger.error("单文件输出模式只支持Base64文本，不能与二进制模式同时使用")
+            return False
+        single_file_path = f"{base_filename}{TEXT_CHUNK_EXTENSION}"
+        if not os.path.isfile(single_file_path):
+            logger.error(f"找不到输入文件: {single_file_path}")
+            return False
+    else:
+        extension = BINARY_CHUNK_EXTENSION if binary else TEXT_CHUNK_EXTENSION
+        try:
+            chunk_files = find_chunk_files(base_filename, extension)
+        except ValueError as e:
+            logger.error(str(e))
             return False
 
-    if not combined_string:
-        logger.error("未找到分块文件或文件为空")
-        return False
+        if not chunk_files:
+            logger.error(f"找不到分块文件: {base_filename}0{extension}")
+            return False
+
+        logger.info(f"共找到 {len(chunk_files)} 个分块文件")
 
-    logger.info(f"共加载 {file_index} 个分块文件")
-    logger.info(f"组合字符串长度: {len(combined_string)} 字符")
+    def open_blocks() -> Iterator[bytes]:
+        """读取输入文件，返回Base64解码后、尚未解密的数据块"""
+        if single_output:
+            contents = iter_single_file_contents(single_file_path)
+        else:
+            contents = iter_chunk_contents(chunk_files, workers)
+        return contents if binary else iter_b64_decoded_blocks(contents)
 
-    # 解码解压缩组合字符串
-    original_code = decode_and_decompress(combined_string, algorithm, decrypt, key)
+    def restore(legacy: bool = False) -> int:
+        """解码、解密、解压缩并写入还原文件，返回还原后的文件大小"""
+        blocks = open_blocks()
+        if decrypt:
+            blocks = iter_decrypted_blocks(blocks, key, legacy)
+        return write_restored_file(blocks, algorithm, restored_code_path)
 
-    if original_code is None:
-        logger.error("解码解压缩失败")
+    # 先检查算法是否可用，无需读取分块文件
+    try:
+        create_decompressor(algorithm)
+    except ValueError as e:
+        logger.error(str(e))
         return False
 
+    if decrypt:
+        logger.info("启用AES解密")
+        logger.info(f"解密密钥: {key}")
+    else:
+        logger.info("跳过AES解密")
+
     # 创建输出目录（如果需要）
     output_dir = os.path.dirname(restored_code_path)
-    if output_dir and not os.path.exists(output_dir):
+    if output_dir:
         try:
-            os.makedirs(output_dir)
-            logger.info(f"创建输出目录: {output_dir}")
+            os.makedirs(output_dir, exist_ok=True)
         except Exception as e:
             logger.error(f"创建输出目录失败: {e}")
             return False
 
-    # 保存还原代码到文件
     try:
-        with open(restored_code_path, 'w', encoding='utf-8') as f_out:
-            f_out.write(original_code)
-
-        logger.info(f"成功保存还原文件: {restored_code_path}")
-        logger.info(f"文件大小: {len(original_code)} 字符")
+        original_size = restore()
+    except Exception as e:
+        error = e
+        original_size = None
 
-        return True
+        # 旧版数据的随机nonce首字节有1/256的概率等于GCM标记。确认GCM认证失败后再按旧版格式解密，
+        # 由解压缩校验结果；仍然失败时报告GCM认证错误，而不是解压缩错误
+        if decrypt:
+            try:
+                gcm_error = check_gcm_authentication(open_blocks(), key)
+            except Exception:
+                gcm_error = None
+            if gcm_error is not None:
+                error = gcm_error
+                logger.warning(f"{gcm_error}，尝试按旧版CTR格式解密")
+                try:
+                    original_size = restore(legacy=True)
+                except Exception:
+                    pass
+
+        if original_size is None:
+            logger.error(f"解码解压缩失败: {error}")
+            if decrypt:
+                logger.error("可能原因: 密钥错误或数据已损坏")
+            return False
 
-    except Exception as e:
-        logger.error(f"保存还原文件出错: {e}")
-        return False
+    logger.info(f"成功保存还原文件: {restored_code_path}")
+    logger.info(f"文件大小: {original_size} 字节")
+    return True
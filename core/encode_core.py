@@ -1,9 +1,21 @@
-import zlib
 import base64
 import os
 import hashlib
 import logging
-from typing import Optional, Tuple
+import mmap
+import stat
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    # zlib-ng与zlib接口兼容，使用SIMD加速的校验和与匹配查找，输出格式相同
+    from zlib_ng import zlib_ng as zlib
+    ZLIB_NG_AVAILABLE = True
+except ImportError:
+    import zlib
+    ZLIB_NG_AVAILABLE = False
 
 try:
     import lzma
@@ -17,10 +29,29 @@ try:
 except ImportError:
     BROTLI_AVAILABLE = False
 
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import deflate
+    DEFLATE_AVAILABLE = True
+except ImportError:
+    DEFLATE_AVAILABLE = False
+
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+
 try:
     from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-    from cryptography.hazmat.primitives import padding
-    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
     CRYPTOGRAPHY_AVAILABLE = True
 except ImportError:
     CRYPTOGRAPHY_AVAILABLE = False
@@ -28,70 +59,168 @@ except ImportError:
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# AES-GCM的nonce和认证标签长度（字节）
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+
+# GCM加密数据的首字节标记（旧版编码器输出的CTR数据没有标记，见core.legacy_cipher）
+MODE_TAG_GCM = 0x04
+
+# 小于该字节数的数据使用标准库base64，避免SIMD分派的固定开销
+PYBASE64_ENCODE_THRESHOLD = 1024
+
+# 流式处理时每次读取的文件块大小 (1 MiB)
+READ_BLOCK_SIZE = 1 << 20
+
+# 并行写入分块文件的线程数
+MAX_WRITE_WORKERS = 8
+
+# 单文件输出模式下分块之间的分隔行（Base64字母表中没有'-'，解码时直接忽略）
+CHUNK_SEPARATOR = b"\n---\n"
+
+# 单次os.writev最多提交的缓冲区数量
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+# 每个写入任务累积的字节数：小分块按批交给写入线程，避免每个分块单独提交任务的开销
+WRITE_BATCH_SIZE = 1 << 20
+
+# 不超过该大小的输入在zlib算法下使用libdeflate一次性压缩
+# (libdeflate不支持流式压缩，需要缓存全部输入，阈值决定了流式压缩额外占用的内存上限)
+LIBDEFLATE_MAX_INPUT_SIZE = 4 << 20
+
+# 超过该大小的输入在多核机器上使用多线程zlib压缩
+PARALLEL_ZLIB_MIN_SIZE = 8 << 20
+
+# deflate滑动窗口大小，多线程压缩时每段以前一段末尾的该长度数据作为预置字典
+DEFLATE_WINDOW_SIZE = 32 * 1024
+
+# brotli质量上限：未指定--brotli-quality时，压缩级别7-9映射为6
+# 质量6以上压缩率提升很小，但速度成倍下降
+BROTLI_DEFAULT_QUALITY = 6
+
+# brotli滑动窗口大小 (2^22 = 4 MiB)；已知输入较小时窗口缩小到刚好覆盖输入，最小2^10
+BROTLI_LGWIN = 22
+BROTLI_MIN_LGWIN = 10
+
+# 分块文件扩展名：Base64文本分块和原始二进制分块
+TEXT_CHUNK_EXTENSION = ".txt"
+BINARY_CHUNK_EXTENSION = ".bin"
+
+# 每次Base64编码的字节数，必须为3的倍数，保证流中间不出现'='填充
+B64_BLOCK_SIZE = 57 * 1024
+
+def b64encode_bytes(data: Union[bytes, bytearray, memoryview]) -> bytes:
+    """Base64编码为ASCII字节串（标准字母表），较大数据优先使用pybase64 (SIMD加速)"""
+    if PYBASE64_AVAILABLE and len(data) >= PYBASE64_ENCODE_THRESHOLD:
+        return pybase64.b64encode(data)
+    return base64.b64encode(data)
+
+def get_input_size(f: BinaryIO) -> Optional[int]:
+    """返回普通文件的大小；管道、FIFO等无法预知大小的输入（st_size为0）返回None"""
+    st = os.fstat(f.fileno())
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+def iter_file_blocks(f: BinaryIO) -> Iterator[Union[bytes, memoryview]]:
+    """
+    按READ_BLOCK_SIZE分块迭代文件内容
+
+    优先通过mmap映射文件，直接产出映射页上的memoryview切片，省去从页缓存
+    到堆内存的拷贝；空文件或不支持mmap的文件（如管道）回退到普通读取。
+    产出的切片只在下一次迭代前有效。
+    """
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        yield from iter(lambda: f.read(READ_BLOCK_SIZE), b"")
+        return
+
+    with mm, memoryview(mm) as view:
+        for offset in range(0, len(view), READ_BLOCK_SIZE):
+            with view[offset:offset + READ_BLOCK_SIZE] as block:
+                yield block
+
 def calculate_file_hash(file_path: str) -> str:
-    """计算文件的SHA256哈希值"""
-    hash_sha256 = hashlib.sha256()
+    """
+    计算文件的SHA256哈希值
+
+    优先mmap整个文件，对连续映射一次性计算哈希；空文件或不支持mmap的文件
+    在Python 3.11+上使用hashlib.file_digest，否则用readinto复用同一个缓冲区按块读取。
+    """
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
-    return hash_sha256.hexdigest()
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+        except (ValueError, OSError):
+            pass
+
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+
+        hash_sha256 = hashlib.sha256()
+        buffer = bytearray(READ_BLOCK_SIZE)
+        with memoryview(buffer) as view:
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hash_sha256.update(view[:size])
+        return hash_sha256.hexdigest()
+
+@lru_cache(maxsize=16)
+def derive_key_bytes(key: str) -> bytes:
+    """使用HKDF-SHA256将密钥派生为32字节（256位），结果按密钥缓存"""
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise ImportError("cryptography库不可用，请安装: pip install cryptography")
+
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'encode_patch')
+    return hkdf.derive(key.encode('utf-8'))
 
-def aes_encrypt(data: bytes, key: str, mode: str = 'ctr') -> bytes:
+@lru_cache(maxsize=16)
+def get_aes_algorithm(key: str):
+    """返回按密钥缓存的algorithms.AES对象（无状态，可在多个Cipher间复用）"""
+    return algorithms.AES(derive_key_bytes(key))
+
+def create_gcm_encryptor(key: str):
+    """
+    创建流式AES GCM加密器
+
+    调用方需在输出前加上MODE_TAG_GCM，并在finalize()之后追加encryptor.tag，
+    最终格式与aes_encrypt一致: 模式标记 + nonce + 密文 + 16字节认证标签
+
+    参数:
+    key (str): 加密密钥
+
+    返回:
+    Tuple[bytes, CipherContext]: (12字节nonce, 加密器)
     """
-    使用AES加密数据（支持多种模式）
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise ImportError("cryptography库不可用，请安装: pip install cryptography")
+
+    nonce = os.urandom(GCM_NONCE_SIZE)
+    cipher = Cipher(get_aes_algorithm(key), modes.GCM(nonce))
+    return nonce, cipher.encryptor()
+
+def aes_encrypt(data: bytes, key: str) -> bytes:
+    """
+    使用AES-256-GCM加密数据
+
+    旧版编码器输出的CTR数据只用于解密兼容，见core.legacy_cipher。
 
     参数:
     data (bytes): 要加密的数据
     key (str): 加密密钥
-    mode (str): 加密模式 ('cbc', 'ctr', 'ofb')
 
     返回:
-    bytes: 加密后的数据
+    bytes: 加密后的数据，格式为 1字节模式标记 + 12字节nonce + 密文 + 16字节认证标签
     """
     if not CRYPTOGRAPHY_AVAILABLE:
         raise ImportError("cryptography库不可用，请安装: pip install cryptography")
 
-    # 将密钥转换为32字节（256位）
-    key_bytes = key.encode('utf-8')
-    if len(key_bytes) < 32:
-        # 如果密钥太短，用0填充
-        key_bytes = key_bytes.ljust(32, b'\x00')
-    elif len(key_bytes) > 32:
-        # 如果密钥太长，截取前32字节
-        key_bytes = key_bytes[:32]
-
-    # 根据模式选择不同的加密方式
-    if mode == 'ctr':
-        # CTR模式：不需要填充，输出大小等于输入大小 + 16字节nonce
-        nonce = os.urandom(16)
-        cipher = Cipher(algorithms.AES(key_bytes), modes.CTR(nonce), backend=default_backend())
-        encryptor = cipher.encryptor()
-        encrypted_data = encryptor.update(data) + encryptor.finalize()
-        return nonce + encrypted_data
-
-    elif mode == 'ofb':
-        # OFB模式：不需要填充，输出大小等于输入大小 + 16字节IV
-        iv = os.urandom(16)
-        cipher = Cipher(algorithms.AES(key_bytes), modes.OFB(iv), backend=default_backend())
-        encryptor = cipher.encryptor()
-        encrypted_data = encryptor.update(data) + encryptor.finalize()
-        return iv + encrypted_data
-
-    else:  # 默认CBC模式（向后兼容）
-        # 生成随机IV
-        iv = os.urandom(16)
-        cipher = Cipher(algorithms.AES(key_bytes), modes.CBC(iv), backend=default_backend())
-        encryptor = cipher.encryptor()
-
-        # PKCS7填充 (AES块大小为16字节 = 128位)
-        padder = padding.PKCS7(128).padder()
-        padded_data = padder.update(data) + padder.finalize()
-
-        # 加密
-        encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
-
-        # 返回 IV + 加密数据
-        return iv + encrypted_data
+    nonce = os.urandom(GCM_NONCE_SIZE)
+    return bytes([MODE_TAG_GCM]) + nonce + AESGCM(derive_key_bytes(key)).encrypt(nonce, data, None)
 
 def should_encrypt_file(file_size: int, force_encrypt: bool = False) -> bool:
     """
@@ -115,105 +244,344 @@ def should_encrypt_file(file_size: int, force_encrypt: bool = False) -> bool:
     else:
         return True   # 大于2KB的文件建议加密
 
-def compress_and_encode(file_path: str, compression_level: int = 9, algorithm: str = 'brotli', encrypt: bool = False, key: str = 'encode_patch', smart_encrypt: bool = True) -> Tuple[Optional[str], Optional[str]]:
+def compress_deflate_segment(data: bytes, zdict: bytes, compression_level: int) -> bytes:
     """
-    读取文件，使用指定算法压缩，然后编码为Base64字符串
+    将一段数据压缩为原始deflate数据，以SYNC_FLUSH结尾（字节对齐且不是最终块），
+    多段结果可以直接拼接
 
     参数:
-    file_path (str): 要压缩的文件路径
+    data (bytes): 本段数据
+    zdict (bytes): 前一段末尾最多32 KiB的数据，作为预置字典以保持压缩率
+    compression_level (int): 压缩级别 (1-9)
+
+    返回:
+    bytes: 原始deflate数据
+    """
+    if zdict:
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def create_parallel_zlib_compressor(compression_level: int, workers: int) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """
+    创建多线程zlib压缩器（与pigz相同的做法）
+
+    每个输入块在线程池中独立压缩为原始deflate数据（zlib压缩期间释放GIL），
+    以前一块末尾32 KiB作为预置字典；按顺序拼接后加上zlib头、空的最终块和
+    adler32校验和，结果是标准的zlib流，解码端无需改动。
+
+    参数:
+    compression_level (int): 压缩级别 (1-9)
+    workers (int): 压缩线程数
+
+    返回:
+    Tuple[Callable, Callable]: (process, finish)，与create_compressor相同
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    header = zlib.compress(b"", compression_level)[:2]
+    adler = 1
+    zdict = b""
+
+    def process(block: bytes) -> bytes:
+        nonlocal header, adler, zdict
+        # mmap切片在下一次迭代后失效，提交给线程前需要复制
+        data = bytes(block)
+        adler = zlib.adler32(data, adler)
+        pending.append(executor.submit(compress_deflate_segment, data, zdict, compression_level))
+        zdict = data[-DEFLATE_WINDOW_SIZE:]
+
+        # 按顺序取出已完成的块；在途数量超过上限时等待最早的块
+        parts = [header]
+        header = b""
+        while pending and (pending[0].done() or len(pending) > workers * 2):
+            parts.append(pending.popleft().result())
+        return b"".join(parts)
+
+    def finish() -> bytes:
+        try:
+            parts = [header] + [future.result() for future in pending]
+            pending.clear()
+            # 空的最终块，结束deflate流
+            parts.append(zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS).flush())
+            parts.append(adler.to_bytes(4, 'big'))
+            return b"".join(parts)
+        finally:
+            executor.shutdown()
+
+    return process, finish
+
+def create_compressor(algorithm: str, compression_level: int, brotli_quality: Optional[int] = None, input_size: Optional[int] = None) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """
+    创建增量压缩器
+
+    参数:
+    algorithm (str): 压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')
+    compression_level (int): 压缩级别 (0-9)
+    brotli_quality (Optional[int]): brotli质量 (0-11)，None表示由压缩级别映射，最高为BROTLI_DEFAULT_QUALITY
+    input_size (Optional[int]): 输入总大小，zlib算法据此选择libdeflate（较小输入）或多线程压缩（较大输入），
+        brotli据此缩小滑动窗口；None表示大小未知（如管道输入），此时zlib始终流式压缩
+
+    返回:
+    Tuple[Callable, Callable]: (process, finish)，process处理一个数据块，finish输出剩余数据
+    """
+    if algorithm == 'zlib':
+        if (DEFLATE_AVAILABLE and compression_level > 0 and input_size is not None
+                and input_size <= LIBDEFLATE_MAX_INPUT_SIZE):
+            # libdeflate比zlib快一倍以上，输出与zlib格式兼容，解码端无需改动
+            buffer = bytearray()
+            compressor = None
+
+            def process(data: bytes) -> bytes:
+                nonlocal compressor
+                if compressor is not None:
+                    return compressor.compress(data)
+                buffer.extend(data)
+                if len(buffer) <= LIBDEFLATE_MAX_INPUT_SIZE:
+                    return b""
+                # 实际输入超过input_size（如读取期间文件变大），改为流式压缩，缓存不超过上限
+                compressor = zlib.compressobj(compression_level)
+                compressed = compressor.compress(buffer)
+                buffer.clear()
+                return compressed
+
+            def finish() -> bytes:
+                if compressor is not None:
+                    return compressor.flush()
+                return deflate.zlib_compress(buffer, compression_level)
+            return process, finish
+        workers = os.cpu_count() or 1
+        if (workers > 1 and compression_level > 0 and input_size is not None
+                and input_size >= PARALLEL_ZLIB_MIN_SIZE):
+            return create_parallel_zlib_compressor(compression_level, workers)
+        compressor = zlib.compressobj(compression_level)
+        return compressor.compress, compressor.flush
+    elif algorithm == 'lzma':
+        if not LZMA_AVAILABLE:
+            raise ValueError("lzma模块不可用，请安装lzma支持")
+        compressor = lzma.LZMACompressor(preset=compression_level)
+        return compressor.compress, compressor.flush
+    elif algorithm == 'brotli':
+        if not BROTLI_AVAILABLE:
+            raise ValueError("brotli模块不可用，请安装brotli支持")
+        if brotli_quality is None:
+            brotli_quality = min(compression_level, BROTLI_DEFAULT_QUALITY)
+        lgwin = BROTLI_LGWIN
+        if input_size is not None:
+            # 窗口超过输入大小没有意义，缩小窗口可减少编码器的内存分配和初始化开销
+            lgwin = max(BROTLI_MIN_LGWIN, min(BROTLI_LGWIN, (input_size - 1).bit_length()))
+        compressor = brotli.Compressor(quality=brotli_quality, lgwin=lgwin)
+        return compressor.process, compressor.finish
+    elif algorithm == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandard模块不可用，请安装: pip install zstandard")
+        # threads=-1: 使用全部CPU核心并行压缩；zstd级别从1开始
+        compressor = zstandard.ZstdCompressor(level=max(compression_level, 1), threads=-1).compressobj()
+        return compressor.compress, compressor.flush
+    else:
+        raise ValueError(f"不支持的压缩算法: {algorithm}")
+
+def iter_compressed_blocks(file_path: Union[str, BinaryIO], compression_level: int = 9, algorithm: str = 'brotli', encrypt: bool = False, key: str = 'encode_patch', stats: Optional[Dict[str, int]] = None, hasher=None, brotli_quality: Optional[int] = None) -> Iterator[bytes]:
+    """
+    流式读取文件，依次压缩并可选AES GCM加密，产出二进制数据块
+
+    各阶段只保留一个数据块，峰值内存为O(MiB)而非O(文件大小)。
+    所有输出块按顺序拼接后即为完整的 (模式标记 + nonce +) 密文/压缩数据。
+
+    参数:
+    file_path (Union[str, BinaryIO]): 要压缩的文件路径，或已打开的二进制文件（由调用方负责关闭）
     compression_level (int): 压缩级别 (0-9)，默认9
-    algorithm (str): 压缩算法 ('zlib', 'lzma', 'brotli')，默认'brotli'
+    algorithm (str): 压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')，默认'brotli'
+    encrypt (bool): 是否启用AES GCM加密
+    key (str): 加密密钥
+    stats (Optional[Dict[str, int]]): 如果提供，结束时写入各阶段的大小统计
+    hasher: 可选的hashlib哈希对象，在同一次读取中对原始数据更新哈希
+    brotli_quality (Optional[int]): brotli质量 (0-11)，None表示由压缩级别映射
 
     返回:
-    Tuple[Optional[str], Optional[str]]: (压缩编码后的字符串, 文件哈希) 或 (None, None) 如果出错
+    Iterator[bytes]: 压缩（加密）后的数据块
     """
-    if not os.path.exists(file_path):
-        logger.error(f"文件 '{file_path}' 未找到")
-        return None, None
+    encryptor = None
+    if encrypt:
+        nonce, encryptor = create_gcm_encryptor(key)
+        yield bytes([MODE_TAG_GCM]) + nonce
 
-    if not os.access(file_path, os.R_OK):
-        logger.error(f"没有读取文件 '{file_path}' 的权限")
-        return None, None
+    original_size = 0
+    compressed_size = 0
 
+    owns_file = isinstance(file_path, (str, bytes, os.PathLike))
+    f = open(file_path, 'rb') if owns_file else file_path
     try:
-        # 计算文件哈希
-        file_hash = calculate_file_hash(file_path)
-        logger.info(f"文件哈希: {file_hash}")
+        process, finish = create_compressor(algorithm, compression_level, brotli_quality, get_input_size(f))
+        for block in iter_file_blocks(f):
+            original_size += len(block)
+            if hasher is not None:
+                hasher.update(block)
+            compressed = process(block)
+            if compressed:
+                compressed_size += len(compressed)
+                yield encryptor.update(compressed) if encryptor else compressed
+    finally:
+        if owns_file:
+            f.close()
+
+    compressed = finish()
+    compressed_size += len(compressed)
+    if encryptor:
+        yield encryptor.update(compressed) + encryptor.finalize() + encryptor.tag
+    elif compressed:
+        yield compressed
+
+    if stats is not None:
+        stats['original_size'] = original_size
+        stats['compressed_size'] = compressed_size
+        stats['encrypted_size'] = compressed_size + 1 + GCM_NONCE_SIZE + GCM_TAG_SIZE if encrypt else compressed_size
+        stats['encoded_size'] = stats['encrypted_size']
+
+def iter_encoded_blocks(file_path: Union[str, BinaryIO], compression_level: int = 9, algorithm: str = 'brotli', encrypt: bool = False, key: str = 'encode_patch', stats: Optional[Dict[str, int]] = None, hasher=None, brotli_quality: Optional[int] = None) -> Iterator[bytes]:
+    """
+    流式读取文件，依次压缩、可选AES GCM加密并编码为Base64块
 
-        # 读取文件内容
-        with open(file_path, 'rb') as f:
-            file_bytes = f.read()
+    所有输出块按顺序拼接后与一次性编码的结果格式相同。
+    参数与iter_compressed_blocks相同。
 
-        original_size = len(file_bytes)
-        logger.info(f"原始文件大小: {original_size} 字节")
+    返回:
+    Iterator[bytes]: Base64编码块 (ASCII字节串)
+    """
+    pending = bytearray()
+    encoded_size = 0
+
+    for block in iter_compressed_blocks(file_path, compression_level, algorithm, encrypt, key, stats, hasher, brotli_quality):
+        pending += block
+        if len(pending) >= B64_BLOCK_SIZE:
+            # 只编码3字节对齐的前缀，剩余部分留到下一轮
+            aligned = len(pending) - len(pending) % 3
+            with memoryview(pending)[:aligned] as view:
+                encoded = b64encode_bytes(view)
+            del pending[:aligned]
+            encoded_size += len(encoded)
+            yield encoded
+
+    if pending:
+        encoded = b64encode_bytes(pending)
+        encoded_size += len(encoded)
+        yield encoded
+
+    if stats is not None:
+        stats['encoded_size'] = encoded_size
+
+def log_encode_stats(stats: Dict[str, int], encrypt: bool, binary: bool = False) -> None:
+    """输出压缩编码各阶段的统计信息"""
+    original_size = stats['original_size']
+    compressed_size = stats['compressed_size']
+    final_size = stats['encoded_size']
+
+    logger.info(f"原始文件大小: {original_size} 字节")
+    logger.info(f"压缩后大小: {compressed_size} 字节")
+
+    if encrypt:
+        # GCM模式只会增加1字节模式标记、12字节nonce和16字节认证标签，不会显著改变大小
+        logger.info(f"加密后大小: {stats['encrypted_size']} 字节")
+        logger.info(f"加密开销: {stats['encrypted_size'] - compressed_size} 字节 (模式标记+GCM nonce+认证标签)")
+
+    # 计算更准确的压缩率
+    compression_ratio = final_size / original_size * 100 if original_size else 0.0
+
+    # 显示详细的压缩统计
+    if binary:
+        logger.info(f"二进制输出大小: {final_size} 字节")
+    else:
+        logger.info(f"Base64编码后大小: {final_size} 字符")
+    logger.info(f"总压缩率: {compression_ratio:.2f}%")
 
-        logger.info(f"使用压缩算法: {algorithm}")
+    if encrypt and not binary and original_size and compressed_size:
+        # 显示各个阶段的开销
+        compress_ratio = compressed_size / original_size * 100
+        base64_ratio = final_size / stats['encrypted_size'] * 100
 
-        # 根据选择的算法进行压缩
-        if algorithm == 'zlib':
-            compressed_data = zlib.compress(file_bytes, level=compression_level)
-        elif algorithm == 'lzma':
-            if not LZMA_AVAILABLE:
-                logger.error("lzma模块不可用，请安装lzma支持")
-                return None, None
-            compressed_data = lzma.compress(file_bytes, preset=compression_level)
-        elif algorithm == 'brotli':
-            if not BROTLI_AVAILABLE:
-                logger.error("brotli模块不可用，请安装brotli支持")
-                return None, None
-            compressed_data = brotli.compress(file_bytes, quality=compression_level)
-        else:
-            logger.error(f"不支持的压缩算法: {algorithm}")
-            return None, None
+        logger.info(f"压缩效率: {compress_ratio:.2f}% (相对原始大小)")
+        logger.info(f"Base64开销: {base64_ratio:.2f}% (相对加密后大小)")
 
-        logger.info(f"压缩后大小: {len(compressed_data)} 字节")
+        # 给出建议
+        if compression_ratio > 150:
+            logger.warning("最终文件大小显著增加，建议检查是否需要对该文件启用加密")
+        elif compression_ratio > 120:
+            logger.info("文件大小有所增加，但加密安全性优先")
 
-        # 可选AES加密（在压缩之后）
-        if encrypt:
-            logger.info("启用AES加密")
-            logger.info(f"加密密钥: {key}")
-            try:
-                encrypted_bytes = aes_encrypt(compressed_data, key, mode='ctr')
-                logger.info(f"加密后大小: {len(encrypted_bytes)} 字节")
+def check_algorithm(algorithm: str) -> bool:
+    """检查压缩算法是否受支持且依赖可用"""
+    try:
+        if algorithm == 'lzma' and not LZMA_AVAILABLE:
+            raise ValueError("lzma模块不可用，请安装lzma支持")
+        if algorithm == 'brotli' and not BROTLI_AVAILABLE:
+            raise ValueError("brotli模块不可用，请安装brotli支持")
+        if algorithm == 'zstd' and not ZSTD_AVAILABLE:
+            raise ValueError("zstandard模块不可用，请安装: pip install zstandard")
+        if algorithm not in ('zlib', 'lzma', 'brotli', 'zstd'):
+            raise ValueError(f"不支持的压缩算法: {algorithm}")
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+    return True
 
-                # CTR模式只会增加16字节IV，不会显著改变大小
-                size_increase = len(encrypted_bytes) - len(compressed_data)
-                logger.info(f"加密开销: {size_increase} 字节 (CTR模式IV)")
+def open_input_file(file_path: str) -> Optional[BinaryIO]:
+    """
+    以二进制只读方式打开输入文件
 
-                compressed_data = encrypted_bytes
-            except ImportError as e:
-                logger.error(f"AES加密失败: {e}")
-                return None, None
-        else:
-            logger.info("跳过AES加密")
+    直接尝试打开并处理异常，而不是先检查存在性和权限再打开，
+    避免检查与打开之间文件被替换或删除的竞争，也省去额外的系统调用。
 
-        # 编码为Base64
-        encoded_bytes = base64.b64encode(compressed_data)
-        encoded_string = encoded_bytes.decode('utf-8')
+    参数:
+    file_path (str): 输入文件路径
 
-        # 计算更准确的压缩率
-        final_size = len(encoded_string)
-        compression_ratio = final_size / original_size * 100
+    返回:
+    Optional[BinaryIO]: 打开的文件对象，失败时返回None
+    """
+    try:
+        return open(file_path, 'rb')
+    except FileNotFoundError:
+        logger.error(f"文件 '{file_path}' 未找到")
+    except PermissionError:
+        logger.error(f"没有读取文件 '{file_path}' 的权限")
+    except IsADirectoryError:
+        logger.error(f"'{file_path}' 是目录，不是文件")
+    except OSError as e:
+        logger.error(f"无法打开文件 '{file_path}': {e}")
+    return None
 
-        # 显示详细的压缩统计
-        logger.info(f"Base64编码后大小: {final_size} 字符")
-        logger.info(f"总压缩率: {compression_ratio:.2f}%")
+def compress_and_encode(file_path: str, compression_level: int = 9, algorithm: str = 'brotli', encrypt: bool = False, key: str = 'encode_patch', smart_encrypt: bool = True, brotli_quality: Optional[int] = None) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    读取文件，使用指定算法压缩，然后编码为Base64
 
-        if encrypt:
-            # 显示各个阶段的开销
-            encrypt_ratio = len(file_bytes) / original_size * 100
-            compress_ratio = len(compressed_data) / len(file_bytes) * 100
-            base64_ratio = final_size / len(compressed_data) * 100
+    参数:
+    file_path (str): 要压缩的文件路径
+    compression_level (int): 压缩级别 (0-9)，默认9
+    algorithm (str): 压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')，默认'brotli'
 
-            logger.info(f"加密开销: {encrypt_ratio:.2f}% (相对原始大小)")
-            logger.info(f"压缩效率: {compress_ratio:.2f}% (相对加密后大小)")
-            logger.info(f"Base64开销: {base64_ratio:.2f}% (相对压缩后大小)")
+    返回:
+    Tuple[Optional[bytes], Optional[str]]: (压缩编码后的Base64字节串, 文件哈希) 或 (None, None) 如果出错
+    """
+    f = open_input_file(file_path)
+    if f is None:
+        return None, None
 
-            # 给出建议
-            if compression_ratio > 150:
-                logger.warning("最终文件大小显著增加，建议检查是否需要对该文件启用加密")
-            elif compression_ratio > 120:
-                logger.info("文件大小有所增加，但加密安全性优先")
+    try:
+        logger.info(f"使用压缩算法: {algorithm}")
+        if encrypt:
+            logger.info("启用AES加密")
+            logger.info(f"加密密钥: {key}")
+        else:
+            logger.info("跳过AES加密")
+
+        # 哈希与压缩共用同一次文件读取
+        stats = {}
+        hash_sha256 = hashlib.sha256()
+        with f:
+            encoded_string = b"".join(iter_encoded_blocks(f, compression_level, algorithm, encrypt, key, stats, hash_sha256, brotli_quality))
+        file_hash = hash_sha256.hexdigest()
+        logger.info(f"文件哈希: {file_hash}")
+        log_encode_stats(stats, encrypt)
 
         return encoded_string, file_hash
 
@@ -221,61 +589,357 @@ def compress_and_encode(file_path: str, compression_level: int = 9, algorithm: s
         logger.error(f"压缩编码过程中出错: {e}")
         return None, None
 
-def save_encoded_string_in_chunks(encoded_string: str, chunk_size: int, base_filename: str = "compress") -> bool:
+def encode_bytes(data: Union[bytes, bytearray, memoryview], compression_level: int = 9, algorithm: str = 'brotli', encrypt: bool = False, key: str = 'encode_patch', brotli_quality: Optional[int] = None, binary: bool = False) -> bytes:
     """
-    将编码后的字符串分块保存到多个文件中
+    在内存中压缩、可选AES GCM加密并编码数据，不读写文件
+
+    数据按READ_BLOCK_SIZE切片送入压缩器，与文件流程的分块方式一致（较大的zlib输入同样多线程压缩）。
+    输出格式与compress_and_save_in_chunks按顺序拼接全部分块的结果相同；不加密时内容也相同，
+    加密时每次调用使用随机nonce，输出各不相同。
 
     参数:
-    encoded_string (str): 完整的编码字符串
-    chunk_size (int): 每个文件的字符数
+    data (Union[bytes, bytearray, memoryview]): 原始数据
+    compression_level (int): 压缩级别 (0-9)，默认9
+    algorithm (str): 压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')，默认'brotli'
+    encrypt (bool): 是否启用AES GCM加密
+    key (str): 加密密钥
+    brotli_quality (Optional[int]): brotli质量 (0-11)，None表示由压缩级别映射
+    binary (bool): 跳过Base64编码，返回原始二进制数据
+
+    返回:
+    bytes: 压缩（加密）后的Base64字节串，binary为True时为二进制数据
+    """
+    process, finish = create_compressor(algorithm, compression_level, brotli_quality, len(data))
+    with memoryview(data) as view:
+        compressed = b"".join(process(view[i:i + READ_BLOCK_SIZE]) for i in range(0, len(view), READ_BLOCK_SIZE))
+    compressed += finish()
+    if encrypt:
+        compressed = aes_encrypt(compressed, key)
+    return compressed if binary else b64encode_bytes(compressed)
+
+def compress_and_save_in_chunks(file_path: str, chunk_size: int, base_filename: str = "compress", compression_level: int = 9, algorithm: str = 'brotli', encrypt: bool = False, key: str = 'encode_patch', brotli_quality: Optional[int] = None, binary: bool = False, single_output: bool = False) -> bool:
+    """
+    流式压缩编码文件并直接写入分块文件，不在内存中保留完整的编码字符串
+
+    文件只读取一遍，SHA256哈希与压缩在同一次读取中完成。
+
+    参数:
+    file_path (str): 要压缩的文件路径
+    chunk_size (int): 每个文件的字符数（二进制分块为字节数），0表示不分块
     base_filename (str): 基础文件名，如 "compress"
+    compression_level (int): 压缩级别 (0-9)，默认9
+    algorithm (str): 压缩算法 ('zlib', 'lzma', 'brotli', 'zstd')，默认'brotli'
+    encrypt (bool): 是否启用AES GCM加密
+    key (str): 加密密钥
+    brotli_quality (Optional[int]): brotli质量 (0-11)，None表示由压缩级别映射
+    binary (bool): 跳过Base64编码，直接写入原始二进制分块 (.bin)，输出体积减少约25%
+    single_output (bool): 所有分块写入单个文件 (<base_filename>.txt)，分块之间以分隔行隔开
 
     返回:
-    bool: 保存成功返回True，否则返回False
+    bool: 成功返回True，否则返回False
     """
-    if encoded_string is None or encoded_string == "":
-        logger.error("没有可保存的数据")
+    if not check_algorithm(algorithm):
+        return False
+
+    if binary and single_output:
+        logger.error("单文件输出模式只支持Base64文本，不能与二进制模式同时使用")
         return False
 
-    if chunk_size == 0:
-        chunk_size = len(encoded_string)
+    f = open_input_file(file_path)
+    if f is None:
+        return False
+
+    logger.info(f"使用压缩算法: {algorithm}")
+    if encrypt:
+        logger.info("启用AES加密")
+        logger.info(f"加密密钥: {key}")
+    else:
+        logger.info("跳过AES加密")
+
+    stats = {}
+    hash_sha256 = hashlib.sha256()
+    with f:
+        if binary:
+            blocks = iter_compressed_blocks(f, compression_level, algorithm, encrypt, key, stats, hash_sha256, brotli_quality)
+            extension = BINARY_CHUNK_EXTENSION
+        else:
+            blocks = iter_encoded_blocks(f, compression_level, algorithm, encrypt, key, stats, hash_sha256, brotli_quality)
+            extension = TEXT_CHUNK_EXTENSION
+        if single_output:
+            saved = save_encoded_stream_single_file(blocks, chunk_size, base_filename)
+        else:
+            saved = save_encoded_stream(blocks, chunk_size, base_filename, extension)
+    if not saved:
+        return False
+
+    logger.info(f"文件哈希: {hash_sha256.hexdigest()}")
+    log_encode_stats(stats, encrypt, binary)
+    return True
+
+def open_output_fd(file_path: Union[str, bytes]) -> int:
+    """以二进制只写方式创建/截断输出文件，返回文件描述符"""
+    return os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+
+def write_fully(fd: int, data: Union[bytes, bytearray, memoryview]) -> None:
+    """将数据完整写入文件描述符（os.write可能只写入部分数据，循环直到写完）"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def write_chunk_file(file_path: Union[str, bytes], data: Union[bytes, bytearray, memoryview]) -> None:
+    """
+    写入单个分块文件（Base64文本和二进制分块均直接以二进制写入）
+
+    分块一次写完，不需要io模块的缓冲层，直接使用os.open/os.write，
+    每个分块只有open、write、close三次系统调用。
+    """
+    fd = open_output_fd(file_path)
+    try:
+        write_fully(fd, data)
+    finally:
+        os.close(fd)
+
+def iter_fixed_size_chunks(blocks: Iterable[bytes], chunk_size: int) -> Iterator[Union[bytes, bytearray, memoryview]]:
+    """
+    将数据块流重新切分为固定大小的分块（最后一块可能较短）
+
+    块内完整的分块以memoryview切片产出，不复制数据；跨块的分块在缓冲区中拼接，
+    产出后换用新的缓冲区，已产出的分块不会再被修改。
+
+    参数:
+    blocks (Iterable[bytes]): 不可变的数据块
+    chunk_size (int): 分块大小，必须大于0
+
+    返回:
+    Iterator[Union[bytes, bytearray, memoryview]]: 按顺序排列的分块
+    """
+    buffer = bytearray()
+    for block in blocks:
+        view = memoryview(block)
+        offset = 0
+        if buffer:
+            # 先用本块开头补齐上一块剩余的部分
+            offset = min(chunk_size - len(buffer), len(view))
+            buffer += view[:offset]
+            if len(buffer) < chunk_size:
+                continue
+            yield buffer
+            buffer = bytearray()
+
+        while len(view) - offset >= chunk_size:
+            yield view[offset:offset + chunk_size]
+            offset += chunk_size
+        buffer += view[offset:]
+
+    if buffer:
+        yield buffer
+
+def writev_fully(fd: int, buffers: List[Union[bytes, bytearray, memoryview]]) -> None:
+    """
+    使用os.writev一次系统调用写入多个缓冲区，不支持writev的平台逐个写入
 
+    writev可能只写入部分数据，剩余部分逐个缓冲区补写。
+    """
+    if not hasattr(os, 'writev'):
+        for data in buffers:
+            write_fully(fd, data)
+        return
+
+    written = os.writev(fd, buffers)
+    for data in buffers:
+        size = len(data)
+        if written >= size:
+            written -= size
+            continue
+        write_fully(fd, memoryview(data)[written:])
+        written = 0
+
+def write_chunk_files(batch: List[Tuple[Union[str, bytes], Union[bytes, bytearray, memoryview]]]) -> None:
+    """按顺序写入一批分块文件"""
+    for file_path, data in batch:
+        write_chunk_file(file_path, data)
+
+def save_encoded_stream(blocks: Iterable[bytes], chunk_size: int, base_filename: str = "compress", extension: str = TEXT_CHUNK_EXTENSION) -> bool:
+    """
+    从Base64编码块的迭代器中读取数据，按固定大小滚动写入多个分块文件
+
+    分块文件按WRITE_BATCH_SIZE打包成批，交给线程池并行写入（文件I/O期间会释放GIL），
+    每个分块在Python层只剩下文件名和切片的开销；在途的批数有上限，内存占用与总数据量无关。
+    块内完整的分块以memoryview切片直接写出，跨块的分块在缓冲区中拼接后
+    直接交给写入线程，不再额外复制一份。
+
+    参数:
+    blocks (Iterable[bytes]): Base64编码块或二进制数据块 (不可变的字节串)
+    chunk_size (int): 每个文件的字符数（字节数），0表示全部写入一个文件
+    base_filename (str): 基础文件名，如 "compress"
+    extension (str): 分块文件扩展名，默认".txt"
+
+    返回:
+    bool: 保存成功返回True，否则返回False
+    """
     if chunk_size < 0:
         logger.error("分块大小必须大于0")
         return False
 
     # 创建输出目录（如果不存在）
-    output_dir = os.path.dirname(base_filename) if os.path.dirname(base_filename) else "."
-    if output_dir != "." and not os.path.exists(output_dir):
+    output_dir = os.path.dirname(base_filename)
+    if output_dir:
         try:
-            os.makedirs(output_dir)
-            logger.info(f"创建输出目录: {output_dir}")
+            os.makedirs(output_dir, exist_ok=True)
         except Exception as e:
             logger.error(f"创建输出目录失败: {e}")
             return False
 
     num_files = 0
-    total_chunks = (len(encoded_string) + chunk_size - 1) // chunk_size  # 向上取整
 
-    logger.info(f"开始分块保存，共 {total_chunks} 个文件")
+    logger.info("开始分块保存")
 
     try:
-        # 按分块大小分割字符串
-        for i in range(0, len(encoded_string), chunk_size):
-            chunk = encoded_string[i:i + chunk_size]
-            file_path = f"{base_filename}{num_files}.txt"
+        if chunk_size == 0:
+            # 不分块：直接顺序写入单个文件
+            # 编码块本身已有几十KB，不经过io缓冲层，每块直接一次write系统调用
+            written = 0
+            fd = open_output_fd(f"{base_filename}0{extension}")
+            try:
+                for block in blocks:
+                    write_fully(fd, block)
+                    written += len(block)
+            finally:
+                os.close(fd)
+            num_files = 1 if written else 0
+            if not written:
+                os.remove(f"{base_filename}0{extension}")
+        else:
+            pending = deque()
+            batch = []
+            batch_size = 0
+            # 预先编码一次路径模板，每个分块只做一次bytes格式化（os.open接受bytes路径）
+            path_template = os.fsencode(base_filename).replace(b"%", b"%%") + b"%d" + os.fsencode(extension)
+
+            with ThreadPoolExecutor(max_workers=MAX_WRITE_WORKERS) as executor:
+                def flush_batch() -> None:
+                    nonlocal batch, batch_size
+                    pending.append(executor.submit(write_chunk_files, batch))
+                    batch = []
+                    batch_size = 0
+
+                    # 限制在途写入数量，等待最早提交的一批写入完成
+                    if len(pending) > MAX_WRITE_WORKERS * 2:
+                        pending.popleft().result()
+
+                    logger.info(f"已保存 {num_files} 个文件")
+
+                def submit_chunk(data: Union[bytes, bytearray, memoryview]) -> None:
+                    nonlocal num_files, batch_size
+                    batch.append((path_template % num_files, data))
+                    batch_size += len(data)
+                    num_files += 1
+                    if batch_size >= WRITE_BATCH_SIZE:
+                        flush_batch()
+
+                for chunk in iter_fixed_size_chunks(blocks, chunk_size):
+                    submit_chunk(chunk)
+                if batch:
+                    flush_batch()
+
+                for future in pending:
+                    future.result()
 
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(chunk)
+    except Exception as e:
+        logger.error(f"保存文件时出错: {e}")
+        return False
 
-            num_files += 1
+    if num_files == 0:
+        logger.error("没有可保存的数据")
+        return False
 
-            if num_files % 10 == 0 or num_files == total_chunks:
-                logger.info(f"已保存 {num_files}/{total_chunks} 个文件")
+    logger.info(f"成功保存 {num_files} 个分块文件")
+    return True
 
-        logger.info(f"成功保存 {num_files} 个分块文件")
-        return True
+def save_encoded_stream_single_file(blocks: Iterable[bytes], chunk_size: int, base_filename: str = "compress") -> bool:
+    """
+    将Base64编码块按固定大小分段后写入单个文件 (<base_filename>.txt)，段之间以分隔行隔开
+
+    不为每个分块创建文件，分段连同分隔行通过os.writev批量写入，
+    每IOV_MAX个缓冲区只需一次系统调用。
+
+    参数:
+    blocks (Iterable[bytes]): Base64编码块 (不可变的ASCII字节串)
+    chunk_size (int): 每段的字符数，0表示不分段（整个编码字符串作为一段）
+    base_filename (str): 基础文件名，输出为 "<base_filename>.txt"
+
+    返回:
+    bool: 保存成功返回True，否则返回False
+    """
+    if chunk_size < 0:
+        logger.error("分块大小必须大于0")
+        return False
 
+    output_dir = os.path.dirname(base_filename)
+    if output_dir:
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except Exception as e:
+            logger.error(f"创建输出目录失败: {e}")
+            return False
+
+    file_path = f"{base_filename}{TEXT_CHUNK_EXTENSION}"
+    num_chunks = 0
+
+    logger.info(f"开始保存到单个文件: {file_path}")
+
+    try:
+        fd = open_output_fd(file_path)
+        try:
+            iov = []
+            written = 0
+            # 不分段时编码块直接依次写入，中间不加分隔行
+            chunks = iter_fixed_size_chunks(blocks, chunk_size) if chunk_size else blocks
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if written and chunk_size:
+                    iov.append(CHUNK_SEPARATOR)
+                iov.append(chunk)
+                written += 1
+                if len(iov) >= IOV_MAX - 1:
+                    writev_fully(fd, iov)
+                    iov = []
+            if written:
+                iov.append(b"\n")
+                writev_fully(fd, iov)
+            num_chunks = written if chunk_size else min(written, 1)
+        finally:
+            os.close(fd)
     except Exception as e:
         logger.error(f"保存文件时出错: {e}")
         return False
+
+    if num_chunks == 0:
+        os.remove(file_path)
+        logger.error("没有可保存的数据")
+        return False
+
+    logger.info(f"成功保存 {num_chunks} 个分段到 {file_path}")
+    return True
+
+def save_encoded_string_in_chunks(encoded_string: Union[str, bytes], chunk_size: int, base_filename: str = "compress") -> bool:
+    """
+    将编码后的字符串分块保存到多个文件中
+
+    参数:
+    encoded_string (Union[str, bytes]): 完整的编码字符串或Base64字节串
+    chunk_size (int): 每个文件的字符数
+    base_filename (str): 基础文件名，如 "compress"
+
+    返回:
+    bool: 保存成功返回True，否则返回False
+    """
+    if not encoded_string:
+        logger.error("没有可保存的数据")
+        return False
+
+    if isinstance(encoded_string, str):
+        encoded_string = encoded_string.encode('utf-8')
+
+    return save_encoded_stream([encoded_string], chunk_size, base_filename)
@@ -0,0 +1,50 @@
+import os
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+# 旧版CTR加密使用的nonce长度（字节）
+LEGACY_NONCE_SIZE = 16
+
+def legacy_key_bytes(key: str) -> bytes:
+    """旧版密钥处理: UTF-8编码后用0填充或截取为32字节（256位）"""
+    return key.encode('utf-8').ljust(32, b'\x00')[:32]
+
+def legacy_aes_encrypt(data: bytes, key: str) -> bytes:
+    """
+    按旧版格式加密数据（仅用于生成兼容旧数据的测试样本）
+
+    旧版编码器输出没有模式标记的AES-CTR数据，密钥不经过HKDF派生。
+
+    参数:
+    data (bytes): 要加密的数据
+    key (str): 加密密钥
+
+    返回:
+    bytes: 加密后的数据，格式为 16字节nonce + 密文
+    """
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise ImportError("cryptography库不可用，请安装: pip install cryptography")
+
+    nonce = os.urandom(LEGACY_NONCE_SIZE)
+    encryptor = Cipher(algorithms.AES(legacy_key_bytes(key)), modes.CTR(nonce)).encryptor()
+    return nonce + encryptor.update(data) + encryptor.finalize()
+
+def create_legacy_decryptor(nonce: bytes, key: str):
+    """
+    为旧版编码器输出的数据创建流式AES-CTR解密器
+
+    参数:
+    nonce (bytes): 加密数据开头的16字节nonce
+    key (str): 解密密钥
+
+    返回:
+    CipherContext: 解密器
+    """
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise ImportError("cryptography库不可用，请安装: pip install cryptography")
+
+    return Cipher(algorithms.AES(legacy_key_bytes(key)), modes.CTR(nonce)).decryptor()
@@ -7,40 +7,36 @@ encode_patch 主程序
 import sys
 import argparse
 import logging
-from core.encode_core import compress_and_encode, save_encoded_string_in_chunks
+from core.encode_core import compress_and_save_in_chunks
 from core.decode_core import load_and_restore_from_chunks
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def encode_file(input_file, output='compress', algorithm='brotli', compression=9, encrypt=True, key='encode_patch', chunk_size=3000):
+def encode_file(input_file, output='compress', algorithm='brotli', compression=9, encrypt=True, key='encode_patch', chunk_size=3000, brotli_quality=None, binary=False, single_output=False):
     """编码文件"""
     logger.info(f"开始编码文件: {input_file}")
 
-    # 压缩编码文件
-    encoded_string, file_hash = compress_and_encode(input_file, compression, algorithm, encrypt, key)
-
-    if encoded_string is None:
-        logger.error("压缩编码失败")
-        return False
-
-    # 分块保存
-    success = save_encoded_string_in_chunks(encoded_string, chunk_size, output)
+    # 流式压缩编码并分块保存
+    success = compress_and_save_in_chunks(input_file, chunk_size, output, compression, algorithm, encrypt, key, brotli_quality, binary, single_output)
 
     if success:
         logger.info("文件编码完成")
-        logger.info(f"输出文件: {output}*.txt")
+        if single_output:
+            logger.info(f"输出文件: {output}.txt")
+        else:
+            logger.info(f"输出文件: {output}*{'.bin' if binary else '.txt'}")
         return True
     else:
-        logger.error("保存分块文件失败")
+        logger.error("压缩编码失败")
         return False
 
-def decode_file(output_file, input='compress', algorithm='brotli', decrypt=True, key='encode_patch'):
+def decode_file(output_file, input='compress', algorithm='brotli', decrypt=True, key='encode_patch', binary=False, single_output=False, workers=None):
     """解码文件"""
     logger.info(f"开始解码文件到: {output_file}")
 
-    success = load_and_restore_from_chunks(output_file, input, algorithm, decrypt, key)
+    success = load_and_restore_from_chunks(output_file, input, algorithm, decrypt, key, binary, single_output, workers)
 
     if success:
         logger.info("文件解码完成")
@@ -69,21 +65,27 @@ def main():
     encode_parser = subparsers.add_parser('encode', help='编码文件')
     encode_parser.add_argument('input_file', help='要编码的输入文件')
     encode_parser.add_argument('-o', '--output', default='compress', help='输出基础文件名')
-    encode_parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli'], default='brotli', help='压缩算法')
+    encode_parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli', 'zstd'], default='brotli', help='压缩算法')
     encode_parser.add_argument('-c', '--compression', type=int, default=9, choices=range(10), help='压缩级别 (0-9)')
+    encode_parser.add_argument('--brotli-quality', type=int, default=None, choices=range(12), help='brotli质量 (0-11)，默认由压缩级别映射')
     encode_parser.add_argument('-s', '--chunk-size', type=int, default=3000, help='分块大小')
     encode_parser.add_argument('-e', '--encrypt', action='store_true', default=True, help='启用加密')
     encode_parser.add_argument('-k', '--key', default='encode_patch', help='加密密钥')
     encode_parser.add_argument('--no-encrypt', action='store_true', help='禁用加密')
+    encode_parser.add_argument('--binary', action='store_true', help='输出二进制分块(.bin)，不进行Base64编码')
+    encode_parser.add_argument('--single-output', action='store_true', help='所有分块写入单个文件，以"---"行分隔')
 
     # decode 子命令
     decode_parser = subparsers.add_parser('decode', help='解码文件')
     decode_parser.add_argument('output_file', help='保存解码文件的路径')
     decode_parser.add_argument('-i', '--input', default='compress', help='输入分块文件基础名称')
-    decode_parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli'], default='brotli', help='解压缩算法')
+    decode_parser.add_argument('-a', '--algorithm', choices=['zlib', 'lzma', 'brotli', 'zstd'], default='brotli', help='解压缩算法')
     decode_parser.add_argument('-d', '--decrypt', action='store_true', default=True, help='启用解密')
     decode_parser.add_argument('-k', '--key', default='encode_patch', help='解密密钥')
     decode_parser.add_argument('--no-decrypt', action='store_true', help='禁用解密')
+    decode_parser.add_argument('--binary', action='store_true', help='读取二进制分块(.bin)')
+    decode_parser.add_argument('--single-output', action='store_true', help='读取单文件输出模式的文件')
+    decode_parser.add_argument('--workers', type=int, default=None, help='并行读取分块文件的线程数')
 
     args = parser.parse_args()
 
@@ -101,7 +103,10 @@ def main():
             args.compression,
             encrypt_enabled,
             args.key,
-            args.chunk_size
+            args.chunk_size,
+            args.brotli_quality,
+            args.binary,
+            args.single_output
         )
     elif args.command == 'decode':
         decrypt_enabled = args.decrypt and not getattr(args, 'no_decrypt', False)
@@ -110,7 +115,10 @@ def main():
             args.input,
             args.algorithm,
             decrypt_enabled,
-            args.key
+            args.key,
+            args.binary,
+            args.single_output,
+            args.workers
         )
 
     sys.exit(0 if success else 1)
@@ -0,0 +1,62 @@
+"""
+测试脚本共用的分块文件查找工具
+"""
+
+import os
+
+def chunk_files(base, extension=".txt"):
+    """
+    通过一次目录扫描列出编码器生成的分块文件
+
+    返回os.DirEntry，可直接作为路径传给os.remove等函数；entry.stat()的结果会被缓存，
+    统计大小时不需要再按路径逐个stat（Windows上目录扫描本身就带有文件大小）。
+
+    参数:
+    base (str): 分块文件的基础文件名，如 "test_output/compress"
+    extension (str): 分块文件扩展名，默认".txt"
+
+    返回:
+    List[os.DirEntry]: 按编号排序的分块文件（包含之前运行残留的文件）
+    """
+    directory, prefix = os.path.split(base)
+    indices = {}
+    try:
+        with os.scandir(directory or ".") as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(prefix) and name.endswith(extension):
+                    suffix = name[len(prefix):-len(extension)]
+                    if suffix.isdigit():
+                        indices[int(suffix)] = entry
+    except FileNotFoundError:
+        return []
+    return [indices[index] for index in sorted(indices)]
+
+def chunk_total_size(chunks):
+    """分块文件的总大小（字节）"""
+    return sum(chunk.stat().st_size for chunk in chunks)
+
+def drop_page_cache(paths):
+    """
+    将文件从页缓存中移除，使随后的读取真正访问磁盘
+
+    刚写入的页是脏页，POSIX_FADV_DONTNEED不会丢弃脏页，因此先fsync写回。
+    不支持posix_fadvise的平台上不做任何操作。
+
+    参数:
+    paths (Iterable[str]): 文件路径
+
+    返回:
+    bool: 是否执行了移除
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
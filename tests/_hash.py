@@ -0,0 +1,72 @@
+"""
+测试脚本共用的文件哈希工具
+"""
+
+import hashlib
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+
+from core.encode_core import READ_BLOCK_SIZE
+
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+def calculate_hash(file_path):
+    """
+    计算文件的完整性哈希值
+
+    这里只用于比较还原前后的文件是否一致，不要求特定算法：优先使用BLAKE3
+    （SIMD加速并在多个线程上并行计算），未安装时使用hashlib.blake2b。
+    文件通过mmap一次性交给哈希对象，避免在Python中逐块循环；空文件或不支持mmap的文件
+    用readinto复用同一个缓冲区按块读取，不为每块分配新的bytes对象。
+
+    参数:
+    file_path (str): 文件路径
+
+    返回:
+    Optional[str]: 十六进制哈希值，文件不存在时返回None
+    """
+    try:
+        f = open(file_path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f:
+        hasher = blake3(max_threads=blake3.AUTO) if BLAKE3_AVAILABLE else hashlib.blake2b()
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hasher.update(mm)
+            return hasher.hexdigest()
+        except (ValueError, OSError):
+            pass
+
+        buffer = bytearray(READ_BLOCK_SIZE)
+        with memoryview(buffer) as view:
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hasher.update(view[:size])
+        return hasher.hexdigest()
+
+def calculate_hash_pair(original_path, restored_path, original_hash=None):
+    """
+    计算原始文件与还原文件的哈希值，两个文件在两个线程中同时读取和计算（哈希计算期间释放GIL）
+
+    参数:
+    original_path (str): 原始文件路径
+    restored_path (str): 还原文件路径
+    original_hash (Optional[str]): 已知的原始文件哈希，提供时只计算还原文件
+
+    返回:
+    Tuple[Optional[str], Optional[str]]: (原始文件哈希, 还原文件哈希)
+    """
+    if original_hash is not None:
+        return original_hash, calculate_hash(restored_path)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        original_hash, restored_hash = executor.map(calculate_hash, (original_path, restored_path))
+    return original_hash, restored_hash
@@ -0,0 +1,59 @@
+"""
+测试脚本共用的性能分析工具
+
+设置环境变量PROFILE=1后，测试中的命令行工具调用会在性能分析器下运行，
+结果保存到 test_profile/ 目录：子进程安装了py-spy时生成火焰图 (.svg)，
+否则使用cProfile生成统计文件 (.prof，可用snakeviz等工具查看)；进程内调用使用cProfile。
+"""
+
+import contextlib
+import cProfile
+import os
+import shutil
+import sys
+
+PROFILE = os.environ.get("PROFILE") == "1"
+
+# 性能分析结果目录（不放在test_output中，避免被测试之间的清理删除）
+PROFILE_DIR = "test_profile"
+
+def profile_path(name, extension):
+    """返回性能分析结果文件路径，并确保目录存在"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{name}{extension}")
+
+def cli_command(module, args, name):
+    """
+    构造以子进程运行命令行工具的命令
+
+    参数:
+    module (str): 命令行模块，如 "cli.encode_cli"
+    args (List[str]): 命令行参数
+    name (str): 性能分析结果的文件名（不含扩展名）
+
+    返回:
+    List[str]: 传给subprocess的命令；未设置PROFILE时为普通的 python -m 调用
+    """
+    command = [sys.executable, "-m", module, *args]
+    if not PROFILE:
+        return command
+
+    py_spy = shutil.which("py-spy")
+    if py_spy:
+        return [py_spy, "record", "-o", profile_path(name, ".svg"), "--", *command]
+    return [sys.executable, "-m", "cProfile", "-o", profile_path(name, ".prof"), "-m", module, *args]
+
+@contextlib.contextmanager
+def profile_section(name):
+    """设置PROFILE时使用cProfile分析代码块，结果保存为 <name>.prof"""
+    if not PROFILE:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path(name, ".prof"))
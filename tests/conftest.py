@@ -0,0 +1,13 @@
+"""
+pytest共用夹具
+"""
+
+import pytest
+
+from tests._fixtures import OUTPUT_DIR, reset_output_dir
+
+@pytest.fixture(scope="session")
+def output_dir():
+    """清空测试输出目录，整个测试会话只执行一次，只有写入该目录的测试模块才使用"""
+    reset_output_dir()
+    return OUTPUT_DIR
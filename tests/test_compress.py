@@ -1,65 +1,89 @@
 #!/usr/bin/env python3
 """
-测试三种压缩算法的性能对比
+测试各压缩算法的性能对比
 """
 
+import contextlib
+import io
 import os
+import random
+import shutil
 import sys
-import subprocess
-import hashlib
+import threading
 import time
-
-def calculate_md5(file_path):
-    """计算文件的MD5哈希值"""
-    if not os.path.exists(file_path):
-        return None
-
-    hash_md5 = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-def test_single_algorithm(algorithm, test_file):
-    """测试单个压缩算法"""
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+# 直接运行脚本时将项目根目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cli.decode_cli import main as decode_main
+from cli.encode_cli import main as encode_main
+from core.encode_core import (
+    CHUNK_SEPARATOR, LIBDEFLATE_MAX_INPUT_SIZE, READ_BLOCK_SIZE, create_compressor, create_parallel_zlib_compressor,
+    encode_bytes, get_input_size,
+)
+from tests._chunks import chunk_files, chunk_total_size, drop_page_cache
+from tests._fixtures import OUTPUT_DIR, reset_output_dir
+from tests._hash import calculate_hash, calculate_hash_pair
+from tests._profile import profile_section
+
+try:
+    import pytest
+    # 在pytest下运行时，先清空测试输出目录
+    pytestmark = pytest.mark.usefixtures("output_dir")
+except ImportError:
+    pass
+
+# 设置COLD_CACHE=1时，解码前将分块文件移出页缓存，解码时间包含真实的磁盘读取
+COLD_CACHE = os.environ.get("COLD_CACHE") == "1"
+
+# 计时前用于预热的少量数据
+WARMUP_DATA = b"encode_patch warmup " * 50
+
+# 从管道读取时输出大小相对按路径读取的上限（无法预知输入大小时不能按0字节缩小压缩窗口）
+PIPE_SIZE_TOLERANCE = 1.05
+
+def run_cli(entry, argv):
+    """在当前进程内调用命令行入口，避免每次启动解释器和重新导入依赖的开销"""
+    try:
+        entry(argv)
+    except SystemExit as e:
+        return e.code in (None, 0)
+    return True
+
+def test_single_algorithm(algorithm, test_file, original_hash=None):
+    """测试单个压缩算法，original_hash为调用方预先计算的原始文件哈希"""
     print(f"\n=== 测试 {algorithm.upper()} 算法 ===")
 
-    output_base = f"test_output/compress_{algorithm}"
-    restored_file = f"test_output/restore_{algorithm}.patch"
+    output_base = os.path.join(OUTPUT_DIR, f"compress_{algorithm}")
+    restored_file = os.path.join(OUTPUT_DIR, f"restore_{algorithm}.patch")
 
-    # 清理旧文件
-    for i in range(10):
-        old_file = f"{output_base}{i}.txt"
-        if os.path.exists(old_file):
-            os.remove(old_file)
-    if os.path.exists(restored_file):
-        os.remove(restored_file)
+    # 预热：先用少量数据完整执行一次同样的压缩和加密，排除首次调用的初始化开销（密钥派生、编解码器初始化等）
+    encode_bytes(WARMUP_DATA, 9, algorithm, encrypt=True)
 
     start_time = time.time()
     original_size = os.path.getsize(test_file)
 
     print(f"开始编码测试...")
     # 编码测试
-    encode_result = subprocess.run([
-        sys.executable, "-m", "cli.encode_cli", test_file,
-        # "--no-encrypt",
-        "-a", algorithm,
-        "-o", output_base,
-        "-c", "9",
-        "-s", "3000"
-    ], capture_output=True, text=True, timeout=120)
-
-    if encode_result.returncode != 0:
-        print(f"编码失败: {encode_result.stderr}")
+    with profile_section(f"encode_{algorithm}"):
+        encoded = run_cli(encode_main, [
+            test_file,
+            # "--no-encrypt",
+            "-a", algorithm,
+            "-o", output_base,
+            "-c", "9",
+            "-s", "3000"
+        ])
+    if not encoded:
+        print("编码失败")
         return None
 
     # 计算压缩文件大小
-    chunk_count = 0
-    total_compressed_size = 0
-    while os.path.exists(f"{output_base}{chunk_count}.txt"):
-        file_size = os.path.getsize(f"{output_base}{chunk_count}.txt")
-        total_compressed_size += file_size
-        chunk_count += 1
+    chunks = chunk_files(output_base)
+    chunk_count = len(chunks)
+    total_compressed_size = chunk_total_size(chunks)
 
     encode_time = time.time() - start_time
 
@@ -68,38 +92,39 @@ def test_single_algorithm(algorithm, test_file):
     print(f"压缩后总大小: {total_compressed_size} 字节")
 
     # 解码测试
+    if COLD_CACHE and drop_page_cache(chunks):
+        print("已将分块文件移出页缓存")
     print(f"开始解码测试...")
     decode_start = time.time()
 
-    decode_result = subprocess.run([
-        sys.executable, "-m", "cli.decode_cli", restored_file,
-        # "--no-decrypt",
-        "-i", output_base,
-        "-a", algorithm
-    ], capture_output=True, text=True, timeout=120)
-
-    if decode_result.returncode != 0:
-        print(f"解码失败: {decode_result.stderr}")
+    with profile_section(f"decode_{algorithm}"):
+        decoded = run_cli(decode_main, [
+            restored_file,
+            # "--no-decrypt",
+            "-i", output_base,
+            "-a", algorithm
+        ])
+    if not decoded:
+        print("解码失败")
         return None
 
     decode_time = time.time() - decode_start
-    total_time = time.time() - start_time
+    total_time = encode_time + decode_time
 
     print(f"解码完成 - 用时: {decode_time:.2f}秒")
 
     # 验证结果
     if os.path.exists(restored_file):
         restored_size = os.path.getsize(restored_file)
-        original_md5 = calculate_md5(test_file)
-        restored_md5 = calculate_md5(restored_file)
+        original_hash, restored_hash = calculate_hash_pair(test_file, restored_file, original_hash)
 
         compression_ratio = (total_compressed_size / original_size) * 100
-        success = original_md5 == restored_md5
+        success = original_hash == restored_hash
 
         print(f"原始文件大小: {original_size} 字节")
         print(f"还原文件大小: {restored_size} 字节")
         print(f"压缩率: {compression_ratio:.2f}%")
-        print(f"MD5验证: {'通过' if success else '失败'}")
+        print(f"哈希验证: {'通过' if success else '失败'}")
         print(f"总用时: {total_time:.2f}秒")
 
         return {
@@ -116,6 +141,197 @@ def test_single_algorithm(algorithm, test_file):
         print("还原文件未生成")
         return None
 
+def test_pipe_input():
+    """测试从管道（FIFO）读取输入：输出大小与按路径读取时相当，且能正确还原"""
+    print("\n=== 管道输入测试 ===")
+
+    test_file = "test.patch"
+    if not hasattr(os, "mkfifo"):
+        print("当前平台不支持FIFO，跳过管道输入测试")
+        return
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    fifo_path = os.path.join(OUTPUT_DIR, "pipe_input.fifo")
+    if os.path.exists(fifo_path):
+        os.remove(fifo_path)
+    os.mkfifo(fifo_path)
+
+    def feed():
+        with open(test_file, 'rb') as src, open(fifo_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+
+    # 写入端在读取端打开FIFO之前会阻塞，使用守护线程，编码失败时不会卡住进程
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        assert run_cli(encode_main, [
+            fifo_path,
+            "-a", "brotli",
+            "--no-encrypt",
+            "-o", os.path.join(OUTPUT_DIR, "pipe"),
+            "-s", "0"
+        ]), "管道输入编码失败"
+    finally:
+        writer.join(timeout=10)
+        os.remove(fifo_path)
+
+    assert run_cli(encode_main, [
+        test_file,
+        "-a", "brotli",
+        "--no-encrypt",
+        "-o", os.path.join(OUTPUT_DIR, "pipe_reference"),
+        "-s", "0"
+    ]), "按路径编码失败"
+
+    pipe_size = chunk_total_size(chunk_files(os.path.join(OUTPUT_DIR, "pipe")))
+    reference_size = chunk_total_size(chunk_files(os.path.join(OUTPUT_DIR, "pipe_reference")))
+    print(f"管道输入编码大小: {pipe_size} 字节，按路径编码大小: {reference_size} 字节")
+    assert pipe_size <= reference_size * PIPE_SIZE_TOLERANCE, "管道输入的压缩输出明显大于按路径读取"
+
+    restored_file = os.path.join(OUTPUT_DIR, "pipe_restore.patch")
+    assert run_cli(decode_main, [
+        restored_file,
+        "-i", os.path.join(OUTPUT_DIR, "pipe"),
+        "--no-decrypt",
+        "-a", "brotli"
+    ]), "管道输入解码失败"
+    original_hash, restored_hash = calculate_hash_pair(test_file, restored_file)
+    assert original_hash == restored_hash, "管道输入还原文件哈希不一致"
+
+    print("✅ 管道输入测试通过")
+
+def test_zlib_bounded_buffering():
+    """测试zlib压缩的输入缓存有上限：大小未知或超过声明大小时流式输出（安装deflate时才会缓存输入）"""
+    print("\n=== zlib缓存上限测试 ===")
+
+    # 管道的st_size为0，不能当作输入大小
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(read_fd, 'rb') as r, os.fdopen(write_fd, 'wb'):
+        assert get_input_size(r) is None, "管道输入的大小应为未知"
+
+    # 不可压缩数据，流式压缩器每处理一块都会有输出
+    data = os.urandom(LIBDEFLATE_MAX_INPUT_SIZE + 2 * READ_BLOCK_SIZE)
+    for input_size in (None, READ_BLOCK_SIZE):
+        process, finish = create_compressor('zlib', 6, input_size=input_size)
+        pending = 0
+        output = []
+        for offset in range(0, len(data), READ_BLOCK_SIZE):
+            compressed = process(data[offset:offset + READ_BLOCK_SIZE])
+            pending = 0 if compressed else pending + READ_BLOCK_SIZE
+            assert pending <= LIBDEFLATE_MAX_INPUT_SIZE, f"输入大小为{input_size}时缓存超过上限"
+            output.append(compressed)
+        output.append(finish())
+        assert zlib.decompress(b"".join(output)) == data, f"输入大小为{input_size}时还原数据不一致"
+
+    print("✅ zlib缓存上限测试通过")
+
+def test_parallel_zlib_compressor():
+    """直接测试多线程zlib压缩器（单核机器上不会走到该路径），拼接出的zlib流必须能被标准zlib还原"""
+    print("\n=== 多线程zlib压缩测试 ===")
+
+    # 可压缩的重复文本夹杂随机字节，跨块的重复内容依赖预置字典
+    rng = random.Random(0)
+    data = b"".join(rng.choice([b"encode_patch ", b"chunk\n", rng.getrandbits(128).to_bytes(16, 'little')]) for _ in range(600000))
+
+    # 块大小: 整块、不对齐的块、小于32 KiB窗口的块和空块
+    block_sizes = [READ_BLOCK_SIZE, READ_BLOCK_SIZE + 12345, 1000, 0, READ_BLOCK_SIZE - 1]
+    inputs = {"空输入": [b""], "多个约1 MiB的块": []}
+    offset = 0
+    for size in block_sizes * 2:
+        inputs["多个约1 MiB的块"].append(memoryview(data)[offset:offset + size])
+        offset += size
+
+    for workers in (2, 4):
+        for level in (1, 9):
+            for name, blocks in inputs.items():
+                process, finish = create_parallel_zlib_compressor(level, workers)
+                compressed = b"".join(process(block) for block in blocks) + finish()
+                expected = b"".join(bytes(block) for block in blocks)
+                assert zlib.decompress(compressed) == expected, f"{name} (线程数{workers}，级别{level}) 还原数据不一致"
+
+    print("✅ 多线程zlib压缩测试通过")
+
+def cli_round_trip(name, encode_args, decode_args, test_file="test.patch"):
+    """
+    通过命令行入口编码再解码，校验还原文件与原始文件一致
+
+    参数:
+    name (str): 输出基础名称（位于测试输出目录下）
+    encode_args (List[str]): 编码的额外参数
+    decode_args (List[str]): 解码的额外参数，需与编码参数对应
+    test_file (str): 原始文件
+
+    返回:
+    str: 编码输出的基础文件名
+    """
+    output_base = os.path.join(OUTPUT_DIR, name)
+    restored_file = os.path.join(OUTPUT_DIR, f"{name}_restore.patch")
+
+    assert run_cli(encode_main, [test_file, "-o", output_base, *encode_args]), f"{name}: 编码失败"
+    assert run_cli(decode_main, [restored_file, "-i", output_base, *decode_args]), f"{name}: 解码失败"
+
+    original_hash, restored_hash = calculate_hash_pair(test_file, restored_file)
+    assert original_hash == restored_hash, f"{name}: 还原文件哈希不一致"
+    return output_base
+
+def test_single_output():
+    """测试单文件输出模式：按大小分段和不分段 (-s 0) 都能正确还原"""
+    print("\n=== 单文件输出测试 ===")
+
+    for chunk_size in (3000, 0):
+        output_base = cli_round_trip(f"single_output_{chunk_size}",
+                                     ["--single-output", "-s", str(chunk_size), "-a", "zlib"],
+                                     ["--single-output", "-a", "zlib"])
+        with open(f"{output_base}.txt", 'rb') as f:
+            has_separator = CHUNK_SEPARATOR in f.read()
+        assert has_separator == (chunk_size > 0), f"-s {chunk_size}: 分隔行与分段设置不符"
+        print(f"✅ -s {chunk_size}: 还原成功")
+
+    print("✅ 单文件输出测试通过")
+
+def test_binary_output():
+    """测试二进制分块 (--binary)：加密与不加密都能正确还原"""
+    print("\n=== 二进制分块测试 ===")
+
+    for name, encrypt_args, decrypt_args in (("binary_encrypt", [], []),
+                                             ("binary_no_encrypt", ["--no-encrypt"], ["--no-decrypt"])):
+        output_base = cli_round_trip(name,
+                                     ["--binary", "-s", "3000", "-a", "brotli", *encrypt_args],
+                                     ["--binary", "-a", "brotli", *decrypt_args])
+        chunks = chunk_files(output_base, ".bin")
+        assert chunks, f"{name}: 没有生成.bin分块文件"
+        assert not chunk_files(output_base), f"{name}: 二进制模式不应生成.txt分块文件"
+        print(f"✅ {name}: {len(chunks)} 个.bin分块，还原成功")
+
+    print("✅ 二进制分块测试通过")
+
+def test_missing_chunk():
+    """测试缺少中间或第一个分块文件时解码报错，而不是写出截断的还原文件"""
+    print("\n=== 分块缺失测试 ===")
+
+    for missing, label in (("middle", "中间的"), ("first", "第一个")):
+        output_base = os.path.join(OUTPUT_DIR, f"missing_{missing}")
+        restored_file = os.path.join(OUTPUT_DIR, f"missing_{missing}_restore.patch")
+
+        assert run_cli(encode_main, ["test.patch", "-o", output_base, "--no-encrypt", "-a", "zlib", "-s", "3000"]), "编码失败"
+        chunks = chunk_files(output_base)
+        assert len(chunks) >= 3, "分块数量不足，无法删除中间的分块"
+        os.remove(chunks[len(chunks) // 2 if missing == "middle" else 0].path)
+
+        decoded = run_cli(decode_main, [restored_file, "-i", output_base, "--no-decrypt", "-a", "zlib"])
+        assert not decoded, f"缺少{label}分块时解码应失败"
+        assert not os.path.exists(restored_file), f"缺少{label}分块时不应生成还原文件"
+        print(f"✅ 缺少{label}分块: 解码失败，未生成还原文件")
+
+    print("✅ 分块缺失测试通过")
+
+def run_algorithm_test(algorithm, test_file, original_hash):
+    """在工作进程中测试单个算法，收集其输出，由主进程按算法顺序打印"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = test_single_algorithm(algorithm, test_file, original_hash)
+    return output.getvalue(), result
+
 def main():
     """主测试函数"""
     print("=== 文件压缩算法性能测试 ===\n")
@@ -127,23 +343,27 @@ def main():
         print(f"错误: 测试文件 '{test_file}' 不存在")
         return
 
-    # 创建输出目录
-    os.makedirs("test_output", exist_ok=True)
+    # 清空输出目录
+    reset_output_dir()
 
-    # 测试的三种算法
-    algorithms = ['zlib', 'lzma', 'brotli']
+    # 测试的压缩算法
+    algorithms = ['zlib', 'lzma', 'brotli', 'zstd']
     results = []
 
     print(f"测试文件: {test_file}")
     print(f"文件大小: {os.path.getsize(test_file)} 字节")
     print("=" * 80)
 
-    # 测试每个算法
-    for algorithm in algorithms:
-        result = test_single_algorithm(algorithm, test_file)
-        if result:
-            results.append(result)
-        print("=" * 80)
+    # 原始文件只计算一次哈希，所有算法共用
+    original_hash = calculate_hash(test_file)
+
+    # 各算法使用独立的输出文件，互不依赖，在多个进程中并行测试
+    with ProcessPoolExecutor(max_workers=len(algorithms)) as executor:
+        for output, result in executor.map(run_algorithm_test, algorithms, [test_file] * len(algorithms), [original_hash] * len(algorithms)):
+            print(output, end="")
+            if result:
+                results.append(result)
+            print("=" * 80)
 
     # 输出对比结果
     if results:
@@ -187,5 +407,22 @@ def main():
     else:
         print("\n❌ 没有成功的测试结果")
 
+    # 功能测试：失败时抛出AssertionError，在pytest下同样会失败
+    feature_tests = [
+        ("管道输入", test_pipe_input),
+        ("zlib缓存上限", test_zlib_bounded_buffering),
+        ("多线程zlib压缩", test_parallel_zlib_compressor),
+        ("单文件输出", test_single_output),
+        ("二进制分块", test_binary_output),
+        ("分块缺失", test_missing_chunk),
+    ]
+
+    print("\n=== 功能测试 ===")
+    for test_name, test_func in feature_tests:
+        try:
+            test_func()
+        except AssertionError as e:
+            print(f"❌ {test_name}: {e}")
+
 if __name__ == "__main__":
     main()
@@ -3,23 +3,50 @@
 测试AES加密功能的完整性
 """
 
+import base64
+import contextlib
+import io
 import os
 import sys
 import subprocess
-import hashlib
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 
-def calculate_md5(file_path):
-    """计算文件的MD5哈希值"""
-    if not os.path.exists(file_path):
-        return None
+# 直接运行脚本时将项目根目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    hash_md5 = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+from tests._fixtures import OUTPUT_DIR, reset_output_dir
+from tests._hash import calculate_hash, calculate_hash_pair
+from tests._profile import cli_command
 
-def test_encryption_workflow():
+try:
+    import pytest
+    # 在pytest下运行时，先清空测试输出目录
+    pytestmark = pytest.mark.usefixtures("output_dir")
+except ImportError:
+    pass
+
+# AES-NI可用时AES-256-GCM的最低吞吐量 (MB/s)，纯软件实现通常只有其几分之一
+AES_MIN_THROUGHPUT = 500
+
+# 设置CHECK_THROUGHPUT=1时吞吐量低于下限会使测试失败；默认只报告，避免共享或降频的CI机器上误报
+CHECK_THROUGHPUT = os.environ.get("CHECK_THROUGHPUT") == "1"
+AES_BENCH_SIZE = 16 << 20
+
+def cpu_has_aes_ni():
+    """读取/proc/cpuinfo检查CPU是否支持AES指令，无法判断时返回None"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                # x86为flags，ARM为Features
+                if line.startswith(('flags', 'Features')):
+                    return 'aes' in line.split(':', 1)[1].split()
+    except OSError:
+        pass
+    return None
+
+def test_encryption_workflow(original_hash=None):
     """测试完整的加密工作流程"""
     print("=== AES加密功能测试 ===\n")
 
@@ -28,69 +55,58 @@ def test_encryption_workflow():
         print(f"错误: 测试文件 '{test_file}' 不存在")
         return False
 
-    # 创建输出目录
-    os.makedirs("test_output", exist_ok=True)
-
-    # 清理旧文件
-    for i in range(10):
-        old_file = f"test_output/encrypt_test{i}.txt"
-        if os.path.exists(old_file):
-            os.remove(old_file)
-    restore_file = "test_output/decrypt_restore.patch"
-    if os.path.exists(restore_file):
-        os.remove(restore_file)
+    restore_file = os.path.join(OUTPUT_DIR, "decrypt_restore.patch")
 
     print("1. 测试AES加密编码...")
     # 使用默认加密
-    encode_result = subprocess.run([
-        sys.executable, "-m", "cli.encode_cli", test_file,
-        "-o", "test_output/encrypt_test",
+    encode_result = subprocess.run(cli_command("cli.encode_cli", [
+        test_file,
+        "-o", os.path.join(OUTPUT_DIR, "encrypt_test"),
         "-a", "brotli",
         "-c", "9"
-    ], capture_output=True, text=True, timeout=120)
+    ], "encode_encrypt_test"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
 
     if encode_result.returncode != 0:
         print("加密编码失败:")
-        print(encode_result.stderr)
+        print(encode_result.stderr.decode(errors='replace'))
         return False
 
     print("✅ 加密编码成功")
 
     print("\n2. 测试AES解密解码...")
     # 使用默认解密
-    decode_result = subprocess.run([
-        sys.executable, "-m", "cli.decode_cli", restore_file,
-        "-i", "test_output/encrypt_test",
+    decode_result = subprocess.run(cli_command("cli.decode_cli", [
+        restore_file,
+        "-i", os.path.join(OUTPUT_DIR, "encrypt_test"),
         "-a", "brotli"
-    ], capture_output=True, text=True, timeout=120)
+    ], "decode_encrypt_test"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
 
     if decode_result.returncode != 0:
         print("解密解码失败:")
-        print(decode_result.stderr)
+        print(decode_result.stderr.decode(errors='replace'))
         return False
 
     print("✅ 解密解码成功")
 
     print("\n3. 验证文件完整性...")
     if os.path.exists(restore_file):
-        original_md5 = calculate_md5(test_file)
-        restored_md5 = calculate_md5(restore_file)
+        original_hash, restored_hash = calculate_hash_pair(test_file, restore_file, original_hash)
 
-        if original_md5 == restored_md5:
-            print("✅ MD5验证通过 - 文件完整性保持")
-            print(f"原始MD5: {original_md5}")
-            print(f"解密MD5: {restored_md5}")
+        if original_hash == restored_hash:
+            print("✅ 哈希验证通过 - 文件完整性保持")
+            print(f"原始哈希: {original_hash}")
+            print(f"解密哈希: {restored_hash}")
             return True
         else:
-            print("❌ MD5验证失败 - 文件损坏")
-            print(f"原始MD5: {original_md5}")
-            print(f"解密MD5: {restored_md5}")
+            print("❌ 哈希验证失败 - 文件损坏")
+            print(f"原始哈希: {original_hash}")
+            print(f"解密哈希: {restored_hash}")
             return False
     else:
         print("❌ 解密文件未生成")
         return False
 
-def test_custom_key():
+def test_custom_key(original_hash=None):
     """测试自定义密钥"""
     print("\n=== 自定义密钥测试 ===\n")
 
@@ -99,52 +115,44 @@ def test_custom_key():
         print("跳过自定义密钥测试")
         return True
 
-    # 清理旧文件
-    for i in range(10):
-        old_file = f"test_output/custom_key{i}.txt"
-        if os.path.exists(old_file):
-            os.remove(old_file)
-    restore_file = "test_output/custom_key_restore.patch"
-    if os.path.exists(restore_file):
-        os.remove(restore_file)
+    restore_file = os.path.join(OUTPUT_DIR, "custom_key_restore.patch")
 
     custom_key = "my_custom_secret_key_123"
 
     print(f"使用自定义密钥: {custom_key}")
 
     # 加密
-    encode_result = subprocess.run([
-        sys.executable, "-m", "cli.encode_cli", test_file,
-        "-o", "test_output/custom_key",
+    encode_result = subprocess.run(cli_command("cli.encode_cli", [
+        test_file,
+        "-o", os.path.join(OUTPUT_DIR, "custom_key"),
         "-k", custom_key,
         "-a", "zlib",
         "-c", "6"
-    ], capture_output=True, text=True, timeout=120)
+    ], "encode_custom_key"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
 
     if encode_result.returncode != 0:
         print("自定义密钥加密失败:")
-        print(encode_result.stderr)
+        print(encode_result.stderr.decode(errors='replace'))
         return False
 
     # 解密
-    decode_result = subprocess.run([
-        sys.executable, "-m", "cli.decode_cli", restore_file,
-        "-i", "test_output/custom_key",
+    decode_result = subprocess.run(cli_command("cli.decode_cli", [
+        restore_file,
+        "-i", os.path.join(OUTPUT_DIR, "custom_key"),
         "-k", custom_key,
         "-a", "zlib"
-    ], capture_output=True, text=True, timeout=120)
+    ], "decode_custom_key"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
 
     if decode_result.returncode != 0:
         print("自定义密钥解密失败:")
-        print(decode_result.stderr)
+        print(decode_result.stderr.decode(errors='replace'))
         return False
 
     # 验证
     if os.path.exists(restore_file):
-        original_md5 = calculate_md5(test_file)
-        restored_md5 = calculate_md5(restore_file)
+        original_hash, restored_hash = calculate_hash_pair(test_file, restore_file, original_hash)
 
-        if original_md5 == restored_md5:
+        if original_hash == restored_hash:
             print("✅ 自定义密钥测试通过")
             return True
         else:
@@ -153,7 +161,7 @@ def test_custom_key():
 
     return False
 
-def test_no_encryption():
+def test_no_encryption(original_hash=None):
     """测试禁用加密功能"""
     print("\n=== 禁用加密测试 ===\n")
 
@@ -162,50 +170,42 @@ def test_no_encryption():
         print("跳过禁用加密测试")
         return True
 
-    # 清理旧文件
-    for i in range(10):
-        old_file = f"test_output/no_encrypt{i}.txt"
-        if os.path.exists(old_file):
-            os.remove(old_file)
-    restore_file = "test_output/no_encrypt_restore.patch"
-    if os.path.exists(restore_file):
-        os.remove(restore_file)
+    restore_file = os.path.join(OUTPUT_DIR, "no_encrypt_restore.patch")
 
     print("禁用AES加密进行测试...")
 
     # 编码（禁用加密）
-    encode_result = subprocess.run([
-        sys.executable, "-m", "cli.encode_cli", test_file,
-        "-o", "test_output/no_encrypt",
+    encode_result = subprocess.run(cli_command("cli.encode_cli", [
+        test_file,
+        "-o", os.path.join(OUTPUT_DIR, "no_encrypt"),
         "--no-encrypt",
         "-a", "lzma",
         "-c", "6"
-    ], capture_output=True, text=True, timeout=120)
+    ], "encode_no_encrypt"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
 
     if encode_result.returncode != 0:
         print("禁用加密编码失败:")
-        print(encode_result.stderr)
+        print(encode_result.stderr.decode(errors='replace'))
         return False
 
     # 解码（禁用解密）
-    decode_result = subprocess.run([
-        sys.executable, "-m", "cli.decode_cli", restore_file,
-        "-i", "test_output/no_encrypt",
+    decode_result = subprocess.run(cli_command("cli.decode_cli", [
+        restore_file,
+        "-i", os.path.join(OUTPUT_DIR, "no_encrypt"),
         "--no-decrypt",
         "-a", "lzma"
-    ], capture_output=True, text=True, timeout=120)
+    ], "decode_no_encrypt"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
 
     if decode_result.returncode != 0:
         print("禁用加密解码失败:")
-        print(decode_result.stderr)
+        print(decode_result.stderr.decode(errors='replace'))
         return False
 
     # 验证
     if os.path.exists(restore_file):
-        original_md5 = calculate_md5(test_file)
-        restored_md5 = calculate_md5(restore_file)
+        original_hash, restored_hash = calculate_hash_pair(test_file, restore_file, original_hash)
 
-        if original_md5 == restored_md5:
+        if original_hash == restored_hash:
             print("✅ 禁用加密测试通过")
             return True
         else:
@@ -214,6 +214,127 @@ def test_no_encryption():
 
     return False
 
+def test_legacy_format(original_hash=None):
+    """测试旧版编码器输出的分块文件（无模式标记的AES-CTR数据）仍可解密还原"""
+    print("\n=== 旧版格式兼容测试 ===\n")
+
+    from core.encode_core import MODE_TAG_GCM
+    from core.legacy_cipher import legacy_aes_encrypt
+
+    test_file = "test.patch"
+    if not os.path.exists(test_file):
+        print("跳过旧版格式兼容测试")
+        return True
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(test_file, 'rb') as f:
+        compressed = zlib.compress(f.read(), 9)
+
+    # 第二种情况: 随机nonce首字节恰好等于GCM标记（约1/256），按GCM解密失败后应改按旧版格式解密
+    for name, gcm_tag_nonce in (("legacy", False), ("legacy_gcm_tag", True)):
+        restore_file = os.path.join(OUTPUT_DIR, f"{name}_restore.patch")
+
+        # 按旧版流程生成分块: 压缩、CTR加密（旧版密钥处理）、Base64编码后按字符数切分
+        encrypted = legacy_aes_encrypt(compressed, "encode_patch")
+        while gcm_tag_nonce and encrypted[0] != MODE_TAG_GCM:
+            encrypted = legacy_aes_encrypt(compressed, "encode_patch")
+        encoded = base64.b64encode(encrypted).decode('ascii')
+        chunk_size = 3000
+        for i in range(0, len(encoded), chunk_size):
+            with open(os.path.join(OUTPUT_DIR, f"{name}{i // chunk_size}.txt"), 'w', encoding='utf-8') as f:
+                f.write(encoded[i:i + chunk_size])
+
+        print(f"已生成 {-(-len(encoded) // chunk_size)} 个旧版格式分块文件 (nonce首字节: {encrypted[0]:#04x})")
+
+        # 使用默认解密
+        decode_result = subprocess.run(cli_command("cli.decode_cli", [
+            restore_file,
+            "-i", os.path.join(OUTPUT_DIR, name),
+            "-a", "zlib"
+        ], f"decode_{name}"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
+
+        if decode_result.returncode != 0:
+            print("旧版格式解密失败:")
+            print(decode_result.stderr.decode(errors='replace'))
+            return False
+
+        # 验证
+        if not os.path.exists(restore_file):
+            print("❌ 解密文件未生成")
+            return False
+
+        original_hash, restored_hash = calculate_hash_pair(test_file, restore_file, original_hash)
+        if original_hash != restored_hash:
+            print("❌ 旧版格式兼容测试失败")
+            return False
+
+    print("✅ 旧版格式兼容测试通过")
+    return True
+
+def test_gcm_authentication(original_hash=None):
+    """测试密文被篡改或密钥错误时解密直接报错，而不是返回错误的数据"""
+    print("\n=== GCM认证测试 ===\n")
+
+    from core.decode_core import aes_decrypt
+    from core.encode_core import aes_encrypt
+
+    encrypted = aes_encrypt(b"GCM authentication test data. " * 10, "encode_patch")
+    tampered = bytearray(encrypted)
+    tampered[len(tampered) // 2] ^= 0x01
+
+    for name, data, key in (("篡改密文", bytes(tampered), "encode_patch"), ("错误密钥", encrypted, "wrong_key")):
+        try:
+            aes_decrypt(data, key)
+        except ValueError as e:
+            print(f"✅ {name}: {e}")
+            continue
+        print(f"❌ {name}: 解密没有报错")
+        return False
+
+    print("✅ GCM认证测试通过")
+    return True
+
+def test_aes_throughput():
+    """测试AES-256-GCM加密吞吐量，确认加密走的是OpenSSL的硬件加速实现"""
+    print("\n=== AES吞吐量测试 ===\n")
+
+    from cryptography.hazmat.backends.openssl.backend import backend
+    from core.encode_core import create_gcm_encryptor
+
+    aes_ni = cpu_has_aes_ni()
+    print(f"OpenSSL版本: {backend.openssl_version_text()}")
+    print(f"CPU AES指令: {'支持' if aes_ni else '未知' if aes_ni is None else '不支持'}")
+
+    data = bytes(AES_BENCH_SIZE)
+    _, encryptor = create_gcm_encryptor("encode_patch")
+    # 预热，排除首次调用的初始化开销
+    encryptor.update(data[:1 << 20])
+
+    start = time.perf_counter()
+    encryptor.update(data)
+    throughput = len(data) / (time.perf_counter() - start) / 1e6
+    print(f"AES-256-GCM吞吐量: {throughput:.0f} MB/s")
+
+    # 只有CPU支持AES指令时才要求达到硬件加速的吞吐量
+    if aes_ni and throughput < AES_MIN_THROUGHPUT:
+        message = f"吞吐量低于 {AES_MIN_THROUGHPUT} MB/s，加密可能没有使用AES-NI加速"
+        assert not CHECK_THROUGHPUT, message
+        print(f"⚠️  {message}（设置CHECK_THROUGHPUT=1时测试失败）")
+
+    print("✅ AES吞吐量测试通过")
+    return True
+
+def run_test_captured(test_func, original_hash):
+    """在工作进程中运行单个测试，收集其输出，由主进程按测试顺序打印"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            success = test_func(original_hash)
+        except Exception as e:
+            print(f"❌ 测试异常: {e}")
+            success = False
+    return output.getvalue(), success
+
 def main():
     """主测试函数"""
     print("🔐 文件压缩编码工具 - AES加密功能测试")
@@ -230,21 +351,38 @@ def main():
     tests = [
         ("默认加密解密", test_encryption_workflow),
         ("自定义密钥", test_custom_key),
-        ("禁用加密", test_no_encryption)
+        ("禁用加密", test_no_encryption),
+        ("旧版格式兼容", test_legacy_format),
+        ("GCM认证", test_gcm_authentication)
     ]
 
     results = []
 
-    for test_name, test_func in tests:
-        print(f"\n🔍 执行测试: {test_name}")
-        try:
-            success = test_func()
+    # 清空输出目录
+    reset_output_dir()
+
+    # 各测试使用同一个原始文件，只计算一次哈希
+    original_hash = calculate_hash("test.patch")
+
+    # 各测试使用独立的输出文件，互不依赖，在多个进程中并行运行（子进程等待期间不占用CPU）
+    with ProcessPoolExecutor(max_workers=len(tests)) as executor:
+        futures = [executor.submit(run_test_captured, test_func, original_hash) for _, test_func in tests]
+        for (test_name, _), future in zip(tests, futures):
+            output, success = future.result()
+            print(f"\n🔍 执行测试: {test_name}")
+            print(output, end="")
             results.append((test_name, success))
             status = "✅ 通过" if success else "❌ 失败"
             print(f"测试结果: {status}")
-        except Exception as e:
-            print(f"❌ 测试异常: {e}")
-            results.append((test_name, False))
+
+    print("\n🔍 执行测试: AES吞吐量")
+    try:
+        success = test_aes_throughput()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        success = False
+    results.append(("AES吞吐量", success))
+    print(f"测试结果: {'✅ 通过' if success else '❌ 失败'}")
 
     print("\n" + "=" * 60)
     print("📊 测试总结:")
@@ -5,96 +5,68 @@
 
 import os
 import sys
-import subprocess
-import tempfile
 
-def create_test_files():
-    """创建不同大小的测试文件"""
-    test_files = {}
+# 直接运行脚本时将项目根目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.encode_core import encode_bytes
+from tests._fixtures import ENTROPY_CONTENTS, SMALL_FILE_CONTENTS, ensure_fixture_files
+
+try:
+    import pytest
+    PYTEST_AVAILABLE = True
+except ImportError:
+    PYTEST_AVAILABLE = False
+
+# brotli质量扫描使用的质量（压缩级别映射的质量最高为6，这里直接指定质量）
+BROTLI_QUALITIES = (1, 4, 6, 9, 11)
 
-    # 创建小文件 (100字节)
-    small_content = b"Hello World! This is a small test file." * 2
-    with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.txt') as f:
-        f.write(small_content)
-        test_files['small_100b'] = f.name
+def create_test_files():
+    """准备不同大小的测试文件（内容不变时复用已有文件）"""
+    return ensure_fixture_files(SMALL_FILE_CONTENTS, "small_file")
 
-    # 创建中等文件 (2KB)
-    medium_content = b"Test content for medium file. " * 100
-    with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.txt') as f:
-        f.write(medium_content)
-        test_files['medium_2kb'] = f.name
+if PYTEST_AVAILABLE:
+    @pytest.fixture(scope="module")
+    def small_test_files():
+        """小文件测试使用的测试文件，整个模块只准备一次"""
+        return create_test_files()
 
-    # 创建大文件 (10KB)
-    large_content = b"Large file content for testing compression ratios. " * 200
-    with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.txt') as f:
-        f.write(large_content)
-        test_files['large_10kb'] = f.name
+    @pytest.fixture(params=sorted(SMALL_FILE_CONTENTS))
+    def file_name(request):
+        """test_file_compression的测试文件名，每个文件运行一次"""
+        return request.param
 
-    return test_files
+    @pytest.fixture
+    def file_path(small_test_files, file_name):
+        """与file_name对应的测试文件路径"""
+        return small_test_files[file_name]
 
 def test_file_compression(file_path, file_name):
     """测试单个文件的压缩"""
     print(f"\n=== 测试文件: {file_name} ===")
-    print(f"原始大小: {os.path.getsize(file_path)} 字节")
 
-    # 清理旧文件
-    for i in range(10):
-        old_file = f"test_output/{file_name}_encrypt{i}.txt"
-        if os.path.exists(old_file):
-            os.remove(old_file)
+    # 只读取一次文件，加密与不加密两次编码共用同一份数据
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    print(f"原始大小: {len(data)} 字节")
 
     # 测试加密压缩
     print("测试AES加密压缩...")
-    result = subprocess.run([
-        sys.executable, "-m", "cli.encode_cli", file_path,
-        "-o", f"test_output/{file_name}_encrypt",
-        "-a", "brotli",
-        "-c", "9",
-        "-v"
-    ], capture_output=True, text=True, timeout=60)
-
-    if result.returncode != 0:
-        print(f"加密压缩失败: {result.stderr}")
+    try:
+        encrypt_size = len(encode_bytes(data, 9, 'brotli', encrypt=True))
+    except Exception as e:
+        print(f"加密压缩失败: {e}")
         return None
 
-    # 计算加密后文件大小
-    encrypt_size = 0
-    chunk_count = 0
-    while os.path.exists(f"test_output/{file_name}_encrypt{chunk_count}.txt"):
-        encrypt_size += os.path.getsize(f"test_output/{file_name}_encrypt{chunk_count}.txt")
-        chunk_count += 1
-
-    # 清理加密文件
-    for i in range(chunk_count):
-        os.remove(f"test_output/{file_name}_encrypt{i}.txt")
-
     # 测试不加密压缩
     print("测试不加密压缩...")
-    result = subprocess.run([
-        sys.executable, "-m", "cli.encode_cli", file_path,
-        "-o", f"test_output/{file_name}_no_encrypt",
-        "-a", "brotli",
-        "-c", "9",
-        "--no-encrypt",
-        "-v"
-    ], capture_output=True, text=True, timeout=60)
-
-    if result.returncode != 0:
-        print(f"不加密压缩失败: {result.stderr}")
+    try:
+        no_encrypt_size = len(encode_bytes(data, 9, 'brotli', encrypt=False))
+    except Exception as e:
+        print(f"不加密压缩失败: {e}")
         return None
 
-    # 计算不加密文件大小
-    no_encrypt_size = 0
-    chunk_count = 0
-    while os.path.exists(f"test_output/{file_name}_no_encrypt{chunk_count}.txt"):
-        no_encrypt_size += os.path.getsize(f"test_output/{file_name}_no_encrypt{chunk_count}.txt")
-        chunk_count += 1
-
-    # 清理不加密文件
-    for i in range(chunk_count):
-        os.remove(f"test_output/{file_name}_no_encrypt{i}.txt")
-
-    original_size = os.path.getsize(file_path)
+    original_size = len(data)
     encrypt_ratio = encrypt_size / original_size * 100
     no_encrypt_ratio = no_encrypt_size / original_size * 100
 
@@ -103,13 +75,25 @@ def test_file_compression(file_path, file_name):
     print(f"  不加密压缩大小: {no_encrypt_size} 字节 ({no_encrypt_ratio:.1f}%)")
     print(f"  加密开销: {encrypt_ratio - no_encrypt_ratio:.1f}%")
 
+    # 扫描不同brotli质量（不加密），找出达到最小输出的最低质量
+    quality_sizes = {quality: len(encode_bytes(data, 9, 'brotli', brotli_quality=quality)) for quality in BROTLI_QUALITIES}
+    best_size = min(quality_sizes.values())
+    best_quality = min(quality for quality, size in quality_sizes.items() if size == best_size)
+
+    print("\nbrotli质量扫描:")
+    for quality, size in quality_sizes.items():
+        print(f"  质量 {quality}: {size} 字节 ({size / original_size * 100:.1f}%)")
+    print(f"  达到最小输出的最低质量: {best_quality}")
+
     return {
         'original_size': original_size,
         'encrypt_size': encrypt_size,
         'no_encrypt_size': no_encrypt_size,
         'encrypt_ratio': encrypt_ratio,
         'no_encrypt_ratio': no_encrypt_ratio,
-        'overhead': encrypt_ratio - no_encrypt_ratio
+        'overhead': encrypt_ratio - no_encrypt_ratio,
+        'quality_sizes': quality_sizes,
+        'best_quality': best_quality
     }
 
 def main():
@@ -128,42 +112,51 @@ def main():
     # 创建测试文件
     test_files = create_test_files()
 
-    # 创建输出目录
-    os.makedirs("test_output", exist_ok=True)
-
     results = []
 
-    try:
-        # 测试每个文件
-        for file_name, file_path in test_files.items():
-            result = test_file_compression(file_path, file_name)
-            if result:
-                results.append((file_name, result))
-
-        # 输出总结
-        print("\n" + "=" * 60)
-        print("📊 测试总结:")
-        print("文件类型      原始大小    加密压缩率    不加密压缩率    加密开销")
-        print("-" * 80)
-
-        for file_name, result in results:
-            print("<12"
-                  "<8"
-                  "<12.1f"
-                  "<12.1f"
-                  "<10.1f")
-
-        print("\n💡 分析结果:")
-        print("1. 小文件(<1KB): 加密开销显著，建议自动跳过加密")
-        print("2. 中等文件(1-5KB): 加密开销适中，可根据需要选择")
-        print("3. 大文件(>5KB): 加密开销相对较小，推荐启用加密")
-        print("4. 智能决策: 系统会自动检测文件大小并给出建议")
-
-    finally:
-        # 清理测试文件
-        for file_path in test_files.values():
-            if os.path.exists(file_path):
-                os.unlink(file_path)
+    # 测试每个文件
+    for file_name, file_path in test_files.items():
+        result = test_file_compression(file_path, file_name)
+        if result:
+            results.append((file_name, result))
+
+    # 输出总结
+    print("\n" + "=" * 60)
+    print("📊 测试总结:")
+    print("文件类型      原始大小    加密压缩率    不加密压缩率    加密开销")
+    print("-" * 80)
+
+    for file_name, result in results:
+        encrypt_ratio = f"{result['encrypt_ratio']:.1f}%"
+        no_encrypt_ratio = f"{result['no_encrypt_ratio']:.1f}%"
+        print(f"{file_name:<14}"
+              f"{result['original_size']:<12}"
+              f"{encrypt_ratio:<14}"
+              f"{no_encrypt_ratio:<16}"
+              f"{result['overhead']:.1f}%")
+
+    print("\n📊 brotli质量扫描 (不加密Base64大小，字节):")
+    print(f"{'文件类型':<12}" + "".join(f"{'质量' + str(quality):<10}" for quality in BROTLI_QUALITIES) + "最佳质量")
+    print("-" * 80)
+
+    for file_name, result in results:
+        print(f"{file_name:<16}"
+              + "".join(f"{result['quality_sizes'][quality]:<12}" for quality in BROTLI_QUALITIES)
+              + f"{result['best_quality']}")
+
+    print("\n💡 分析结果:")
+    print("1. 小文件(<1KB): 加密开销显著，建议自动跳过加密")
+    print("2. 中等文件(1-5KB): 加密开销适中，可根据需要选择")
+    print("3. 大文件(>5KB): 加密开销相对较小，推荐启用加密")
+    print("4. 智能决策: 系统会自动检测文件大小并给出建议")
+    # 只根据普通小文件给出建议，熵测试文件的结果取决于随机数据所占比例
+    small_results = [result for file_name, result in results if file_name not in ENTROPY_CONTENTS]
+    if small_results:
+        best_quality = max(result['best_quality'] for result in small_results)
+        if best_quality < BROTLI_QUALITIES[-1]:
+            print(f"5. brotli质量: 小文件在质量{best_quality}即可达到最小输出，更高质量只增加耗时")
+        else:
+            print(f"5. brotli质量: 小文件在质量{best_quality}才达到最小输出，需要最小输出时可使用 --brotli-quality {best_quality}")
 
 if __name__ == "__main__":
     main()